@@ -0,0 +1,121 @@
+import threading
+from datetime import date, datetime
+import numpy as np
+import pytz
+import history
+
+# Constants
+TIMEZONE = 'Asia/Kolkata'
+
+# Every result is one of 100 values (00-99); missing days are stored as -1
+VALUES = 100
+MISSING = -1
+TOP = 5
+
+_lock = threading.Lock()
+_cache = {'version': None, 'history': None, 'stats': {}}
+
+def ist_today():
+    """Today's date in IST, the timezone the results are published in."""
+    return datetime.now(pytz.timezone(TIMEZONE)).date()
+
+class History:
+    """All results as a (day x game) int8 matrix."""
+
+    def __init__(self, results):
+        days = sorted({day for day, _, _ in results})
+        self.games = sorted({game for _, game, _ in results})
+        self.dates = np.array([date.fromisoformat(day) for day in days], dtype='datetime64[D]')
+        day_index = {day: i for i, day in enumerate(days)}
+        game_index = {game: i for i, game in enumerate(self.games)}
+
+        self.matrix = np.full((len(days), len(self.games)), MISSING, dtype=np.int8)
+        if results:
+            rows = np.fromiter((day_index[day] for day, _, _ in results), dtype=np.int64, count=len(results))
+            cols = np.fromiter((game_index[game] for _, game, _ in results), dtype=np.int64, count=len(results))
+            values = np.fromiter((int(number) for _, _, number in results), dtype=np.int8, count=len(results))
+            self.matrix[rows, cols] = values
+        # 1970-01-01 was a Thursday; shift so Monday is 0 like date.weekday()
+        self.weekdays = (self.dates.astype(np.int64) + 3) % 7
+
+    def column(self, game):
+        if game not in self.games:
+            return None
+        return self.games.index(game)
+
+def _top(counts, n, reverse=True):
+    order = np.argsort(-counts if reverse else counts, kind='stable')[:n]
+    return [(int(value), int(counts[value])) for value in order]
+
+def compute_game_stats(hist, game, today=None):
+    """Frequency, hot/cold, jodi digit, weekday and streak statistics for one game."""
+    col = hist.column(game)
+    if col is None:
+        return None
+    column = hist.matrix[:, col]
+    valid = column != MISSING
+    values = column[valid].astype(np.int64)
+    if not len(values):
+        return None
+    dates = hist.dates[valid]
+    weekdays = hist.weekdays[valid]
+
+    frequency = np.bincount(values, minlength=VALUES)
+    tens = np.bincount(values // 10, minlength=10)
+    units = np.bincount(values % 10, minlength=10)
+    by_weekday = np.bincount(weekdays * VALUES + values, minlength=7 * VALUES).reshape(7, VALUES)
+
+    # Draws since each number last appeared (numbers never seen count as the whole history)
+    last_seen = np.full(VALUES, -1, dtype=np.int64)
+    np.maximum.at(last_seen, values, np.arange(len(values)))
+    overdue = len(values) - 1 - last_seen
+
+    # Longest run of the same number on consecutive draws
+    changes = np.flatnonzero(np.diff(values) != 0)
+    run_ends = np.append(changes, len(values) - 1)
+    run_lengths = np.diff(np.insert(run_ends, 0, -1))
+    longest = int(np.argmax(run_lengths))
+
+    weekday = (today or ist_today()).weekday()
+    return {
+        'game': game,
+        'draws': int(len(values)),
+        'first_date': dates[0].item(),
+        'last_date': dates[-1].item(),
+        'frequency': frequency,
+        'hot': _top(frequency, TOP),
+        'cold': _top(frequency, TOP, reverse=False),
+        'overdue': _top(overdue, TOP),
+        'tens': tens,
+        'units': units,
+        'weekday': weekday,
+        'weekday_top': _top(by_weekday[weekday], 3),
+        'longest_repeat': (int(values[run_ends[longest]]), int(run_lengths[longest])),
+    }
+
+def get_history():
+    """The result matrix for the current data version, rebuilt only when results change."""
+    version = history.data_version()
+    with _lock:
+        if _cache['version'] != version:
+            _cache['history'] = History(history.all_results())
+            _cache['stats'] = {}
+            _cache['version'] = version
+        return _cache['history']
+
+def game_stats(*names):
+    """Statistics for the first of `names` (e.g. game code, display name) found in the history."""
+    hist = get_history()
+    today = ist_today()
+    for name in names:
+        key = (name, today)
+        with _lock:
+            if key in _cache['stats'] and _cache['history'] is hist:
+                return _cache['stats'][key]
+        stats = compute_game_stats(hist, name, today)
+        if stats is not None:
+            with _lock:
+                if _cache['history'] is hist:
+                    _cache['stats'][key] = stats
+            return stats
+    return None
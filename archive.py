@@ -0,0 +1,112 @@
+"""Fill the local chart archive from chart.php.
+
+    python archive.py backfill [--from-year 2015] [--workers 4] [--rate 2]
+    python archive.py sync [--workers 4] [--rate 2]
+
+backfill fetches every month from --from-year up to the current month that is
+not already stored as a closed month, so an interrupted run simply resumes.
+sync only fetches the months after the watermark: the newest month of the
+unbroken run of closed months stored from FIRST_YEAR. Months the bot stored on
+demand after a gap do not move it, so the gap is still filled.
+"""
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import chart_store
+import fetcher
+
+# Constants
+FIRST_YEAR = chart_store.FIRST_YEAR
+
+class RateLimiter:
+    """Lets at most `rate` requests start per second across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def pending_months(months):
+    """The months that are not stored yet or whose stored copy is stale."""
+    _, missing = chart_store.plan_months(months)
+    return missing
+
+def fetch_months(months, workers, rate):
+    """Fetch and store months in parallel; returns (stored, empty, failed) counts."""
+    limiter = RateLimiter(rate)
+    counts = {'stored': 0, 'empty': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def fetch_one(pair):
+        limiter.wait()
+        try:
+            chart = chart_store.refresh_month(*pair)
+            outcome = 'stored' if chart and chart[1] else 'empty'
+        except Exception as e:
+            logging.error(f"Failed to fetch {pair[1]:02}-{pair[0]}: {str(e)}")
+            outcome = 'failed'
+        with counts_lock:
+            counts[outcome] += 1
+            done = sum(counts.values())
+        logging.info(f"[{done}/{len(months)}] {pair[1]:02}-{pair[0]}: {outcome}")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive') as pool:
+        list(pool.map(fetch_one, months))
+    return counts['stored'], counts['empty'], counts['failed']
+
+def backfill(from_year=FIRST_YEAR, workers=4, rate=2.0):
+    months = pending_months(chart_store.months_between((from_year, 1), chart_store.current_month()))
+    logging.info(f"Backfill: {len(months)} months to fetch")
+    return fetch_months(months, workers, rate)
+
+def watermark():
+    """The newest month of the unbroken run of closed months stored from FIRST_YEAR, or None."""
+    months = chart_store.months_between((FIRST_YEAR, 1), chart_store.current_month())
+    stored = chart_store.load_months(months)
+    newest = None
+    for pair in months:
+        entry = stored.get(pair)
+        if not entry or not chart_store.is_closed(*pair, entry[2]):
+            break
+        newest = pair
+    return newest
+
+def sync(workers=4, rate=2.0):
+    closed = watermark()
+    if closed is None:
+        start = (FIRST_YEAR, 1)
+    else:
+        start = (closed[0] + 1, 1) if closed[1] == 12 else (closed[0], closed[1] + 1)
+    months = pending_months(chart_store.months_between(start, chart_store.current_month()))
+    logging.info(f"Sync from {start[1]:02}-{start[0]}: {len(months)} months to fetch")
+    return fetch_months(months, workers, rate)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['backfill', 'sync'])
+    parser.add_argument('--from-year', type=int, default=FIRST_YEAR, help='first year to backfill')
+    parser.add_argument('--workers', type=int, default=min(4, fetcher.FETCH_WORKERS), help='parallel requests')
+    parser.add_argument('--rate', type=float, default=2.0, help='maximum requests started per second')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    workers = min(args.workers, fetcher.FETCH_WORKERS)
+    if args.command == 'backfill':
+        stored, empty, failed = backfill(args.from_year, workers, args.rate)
+    else:
+        stored, empty, failed = sync(workers, args.rate)
+    logging.info(f"Done: {stored} stored, {empty} without data, {failed} failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Upper bound on the total size of cached exports held in memory (bytes)
+MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Exports are also kept on disk, shared by every worker process and kept across restarts;
+# set ARTIFACT_DISK_BYTES to 0 to turn this off
+DISK_DIR = os.environ.get('ARTIFACT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'satta-artifacts'))
+DISK_MAX_BYTES = int(os.environ.get('ARTIFACT_DISK_BYTES', 512 * 1024 * 1024))
+
+class ArtifactCache:
+    """Size-capped LRU cache of generated export files, in memory and optionally on disk."""
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.directory = directory if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+        data = self._read_disk(key)
+        if data is not None:
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def _put_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key_digest(key) + '.xlsx')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)  # Most recently used files are evicted last
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.directory or len(data) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        try:
+            # Written under a temporary name, so other processes never read half a file
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logging.error(f"Could not write cached export {path}: {str(e)}")
+
+    def _evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.xlsx'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass  # Already removed by another worker
+
+    def __len__(self):
+        return len(self._items)
+
+def data_version(month_charts):
+    """Version of the chart data behind an export; changes whenever any month's rows change.
+
+    The same data gives the same version in every worker process and after a restart.
+    """
+    encoded = json.dumps([[key, rows] for key, rows in month_charts], separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def key_digest(key):
+    """Stable text form of a cache key such as (months, highlight, data version)."""
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+artifacts = ArtifactCache(MAX_BYTES, DISK_DIR, DISK_MAX_BYTES)
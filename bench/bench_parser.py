@@ -0,0 +1,48 @@
+"""Micro-benchmark for the chart and homepage parsers.
+
+Run from the repository root:
+
+    python bench/bench_parser.py [iterations]
+"""
+import os
+import sys
+import timeit
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chart_parser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+def parse_chart_full_page(html):
+    """The original approach: parse the whole page, then look for the table."""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='chart-table')
+    return [[cell.text.strip() for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr')]
+
+def report(label, func, html, iterations):
+    seconds = timeit.timeit(lambda: func(html), number=iterations)
+    print(f"{label:<32} {seconds / iterations * 1000:8.3f} ms/page")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chart_html = load_fixture('chart.html')
+    home_html = load_fixture('home.html')
+
+    print(f"lxml available: {chart_parser.lxml is not None}")
+    report("chart: full page html.parser", parse_chart_full_page, chart_html, iterations)
+    report("chart: SoupStrainer", chart_parser._parse_chart_soup, chart_html, iterations)
+    if chart_parser.lxml is not None:
+        report("chart: lxml", chart_parser._parse_chart_lxml, chart_html, iterations)
+
+    report("homepage: html.parser", chart_parser._parse_homepage_soup, home_html, iterations)
+    if chart_parser.lxml is not None:
+        report("homepage: lxml", chart_parser._parse_homepage_lxml, home_html, iterations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Offline test of result subscriptions and the broadcast pipeline.
+
+Subscribes simulated chats to a game, then flips the game's result on the fake
+homepage from XX to a number, refreshes it as a user's request would and runs
+the poller. Checks that the result is announced once, that every subscriber
+gets it, and that chats which blocked the bot are unsubscribed. Reports the broadcast rate.
+
+Run from the repository root:
+
+    python bench/broadcast_test.py --subscribers 200 --blocked 10
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import FakeServer
+
+GAME = 'GALI'
+NUMBER = '42'
+FIRST_CHAT = 50000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=200, help='chats subscribed to the game')
+    parser.add_argument('--blocked', type=int, default=10, help='subscribers that blocked the bot')
+    parser.add_argument('--rate', type=float, default=30, help='global Bot API calls per second')
+    args = parser.parse_args()
+
+    server = FakeServer()
+    server.start()
+
+    # Configure the bot before importing it
+    workdir = tempfile.mkdtemp(prefix='satta-bench-')
+    os.environ['TOKEN'] = '1000:BENCH'
+    os.environ['SATTA_BASE_URL'] = server.base_url
+    os.environ['CHART_DB'] = os.path.join(workdir, 'bench.db')
+    os.environ['TELEGRAM_GLOBAL_RATE'] = str(args.rate)
+    from telebot import apihelper
+    apihelper.API_URL = server.base_url + 'bot{0}/{1}'
+    import mains
+    import homepage
+    import poller
+    import subscriptions
+    # The app's startup hook registers the announcer; the web server is not started here
+    poller.on_result(mains.announce_result)
+
+    chats = range(FIRST_CHAT, FIRST_CHAT + args.subscribers)
+    for chat_id in chats:
+        subscriptions.subscribe(chat_id, GAME)
+    server.blocked.update(chats[:args.blocked])
+
+    # First poll sees XX; the second sees the published number
+    poller.poll_once()
+    server.homepage = server.homepage.replace(
+        b'GALI</h3><h3 class="game-time">at 11:30 PM</h3></td><td class="yesterday-number"><h3>49</h3></td>'
+        b'<td class="today-number"><h3>XX</h3>',
+        f'GALI</h3><h3 class="game-time">at 11:30 PM</h3></td><td class="yesterday-number"><h3>49</h3></td>'
+        f'<td class="today-number"><h3>{NUMBER}</h3>'.encode()
+    )
+    started = time.perf_counter()
+    # A user's request fetches the new number before the poller does
+    homepage.refresh()
+    poller.poll_once()
+    for chat_id in chats:
+        if not server.wait_for(chat_id, 'sendMessage', 0):
+            print(f"chat {chat_id} got no message")
+            return 1
+    elapsed = time.perf_counter() - started
+
+    # A later poll must not announce the same result again
+    sent = server.api_calls['sendMessage']
+    poller.poll_once()
+    time.sleep(1)
+    repeated = server.api_calls['sendMessage'] - sent
+
+    remaining = sum(1 for chat_id in chats if GAME in subscriptions.games_of(chat_id))
+    print(f"{args.subscribers} subscribers notified in {elapsed:.2f}s "
+          f"({args.subscribers / elapsed:.1f} msg/s, limit {args.rate:g}/s)")
+    print(f"repeated announcements: {repeated}")
+    print(f"still subscribed: {remaining} (expected {args.subscribers - args.blocked})")
+    server.stop()
+    return 0 if repeated == 0 and remaining == args.subscribers - args.blocked else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+"""Offline load test for the bot.
+
+Serves the recorded homepage and chart.php fixtures from a local HTTP server,
+points telebot at a fake Bot API on the same server, and drives scripted user
+sessions through the webhook bot (mains.py) concurrently. Reports p50/p99
+latency and throughput per flow.
+
+Run from the repository root:
+
+    python bench/load_test.py --users 20 --rounds 3 --upstream-delay 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'bench', 'fixtures')
+sys.path.insert(0, ROOT)
+
+BOT_ID = 1000
+FLOW_TIMEOUT = 120
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+class FakeServer:
+    """Stand-in for satta-king-fast.com and the Telegram Bot API."""
+
+    def __init__(self, upstream_delay=0.0):
+        self.upstream_delay = upstream_delay
+        self.homepage = load_fixture('home.html')
+        self.chart = load_fixture('chart.html')
+        self.upstream_requests = 0
+        self.api_calls = defaultdict(int)
+        self.blocked = set()  # chats that answer 403 as if they blocked the bot
+        self._next_message_id = 1
+        self._lock = threading.Lock()
+        self._events = defaultdict(list)
+        self._condition = threading.Condition()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def wait_for(self, chat_id, method, since):
+        """Block until the fake Bot API saw `method` for chat_id after event index `since`."""
+        deadline = time.time() + FLOW_TIMEOUT
+        with self._condition:
+            while True:
+                if method in self._events[chat_id][since:]:
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+    def mark(self, chat_id):
+        with self._condition:
+            return len(self._events[chat_id])
+
+    def _record(self, chat_id, method):
+        with self._condition:
+            self._events[chat_id].append(method)
+            self._condition.notify_all()
+
+    def _api_result(self, method, params):
+        chat_id = int(params.get('chat_id', 0))
+        with self._lock:
+            self.api_calls[method] += 1
+        if chat_id in self.blocked:
+            self._record(chat_id, method)
+            return {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}
+        with self._lock:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        if method in ('answerCallbackQuery', 'deleteMessage'):
+            result = True
+        else:
+            result = {
+                'message_id': message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bot'},
+                'text': params.get('text', ''),
+            }
+            if method == 'sendDocument':
+                result['document'] = {'file_id': f"file-{message_id}", 'file_unique_id': f"u-{message_id}"}
+        self._record(chat_id, method)
+        return {'ok': True, 'result': result}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body, content_type, headers=None):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+
+                if url.path.startswith('/bot'):
+                    method = url.path.rsplit('/', 1)[-1]
+                    self._reply(json.dumps(server._api_result(method, params)).encode(), 'application/json')
+                    return
+
+                with server._lock:
+                    server.upstream_requests += 1
+                if server.upstream_delay:
+                    time.sleep(server.upstream_delay)
+                body = server.chart if url.path.endswith('chart.php') else server.homepage
+                etag = f'"{len(body)}-{hash(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self._reply(body, 'text/html; charset=utf-8', {'ETag': etag})
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
+
+def user(chat_id):
+    return {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'}
+
+def message_update(update_id, chat_id, text):
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'text': text,
+        'chat': {'id': chat_id, 'type': 'private'}, 'from': user(chat_id),
+    }}
+
+def callback_update(update_id, chat_id, data):
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user(chat_id), 'chat_instance': str(chat_id), 'data': data,
+        'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': 'menu',
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bot'},
+        },
+    }}
+
+class Driver:
+    """Feeds updates to the bot and times each flow until its final Bot API call."""
+
+    def __init__(self, bot, server):
+        self.bot = bot
+        self.server = server
+        self._update_id = 0
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def _next_id(self):
+        with self._lock:
+            self._update_id += 1
+            return self._update_id
+
+    def step(self, chat_id, update, final_method):
+        from telebot.types import Update
+        import workers
+        since = self.server.mark(chat_id)
+        started = time.perf_counter()
+        # Same path as the webhook: the update is handled on the update pool
+        workers.submit_update(self.bot, Update.de_json(update))
+        ok = self.server.wait_for(chat_id, final_method, since)
+        return ok, time.perf_counter() - started
+
+    def run_flow(self, flow, chat_id, steps):
+        """Run setup steps untimed, then time the last step of the flow."""
+        for build, final_method in steps[:-1]:
+            ok, _ = self.step(chat_id, build(self._next_id(), chat_id), final_method)
+            if not ok:
+                self.failures[flow] += 1
+                return
+        build, final_method = steps[-1]
+        ok, seconds = self.step(chat_id, build(self._next_id(), chat_id), final_method)
+        with self._lock:
+            if ok:
+                self.latencies[flow].append(seconds)
+            else:
+                self.failures[flow] += 1
+
+def flows(month_ranges):
+    """Scripted sessions: flow name -> list of (update builder, final Bot API method)."""
+    scripts = {
+        'chart': [(lambda uid, chat: callback_update(uid, chat, 'month_january_2020'), 'sendDocument')],
+        'predict': [(lambda uid, chat: callback_update(uid, chat, 'predict_GALI'), 'editMessageText')],
+    }
+    for months in month_ranges:
+        scripts[f"checkmynumber_{months}"] = [
+            (lambda uid, chat: callback_update(uid, chat, 'checkmynumber'), 'editMessageText'),
+            (lambda uid, chat: message_update(uid, chat, '42'), 'sendMessage'),
+            (lambda uid, chat, months=months: callback_update(uid, chat, f"number_months_{months}"), 'sendDocument'),
+        ]
+    return scripts
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent simulated users')
+    parser.add_argument('--rounds', type=int, default=3, help='flows run by each user')
+    parser.add_argument('--upstream-delay', type=float, default=50, help='simulated upstream latency (ms)')
+    parser.add_argument('--months', default='6,60,120', help='month ranges for check-my-number')
+    args = parser.parse_args()
+
+    server = FakeServer(upstream_delay=args.upstream_delay / 1000)
+    server.start()
+
+    # Configure the bot before importing it
+    workdir = tempfile.mkdtemp(prefix='satta-bench-')
+    os.environ['TOKEN'] = '1000:BENCH'
+    os.environ['SATTA_BASE_URL'] = server.base_url
+    os.environ['CHART_DB'] = os.path.join(workdir, 'bench.db')
+    from telebot import apihelper
+    apihelper.API_URL = server.base_url + 'bot{0}/{1}'
+    import mains
+
+    driver = Driver(mains.bot, server)
+    scripts = flows([int(months) for months in args.months.split(',')])
+    jobs = []
+    for round_number in range(args.rounds):
+        for user_number in range(args.users):
+            name = list(scripts)[(round_number + user_number) % len(scripts)]
+            chat_id = 10000 + user_number
+            jobs.append((name, chat_id))
+
+    # Users are independent; one user's flows run one after another
+    by_user = defaultdict(list)
+    for name, chat_id in jobs:
+        by_user[chat_id].append(name)
+
+    def run_user(chat_id):
+        for name in by_user[chat_id]:
+            driver.run_flow(name, chat_id, scripts[name])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(run_user, by_user))
+    elapsed = time.perf_counter() - started
+
+    print(f"{'flow':<22} {'runs':>5} {'fail':>5} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for name in scripts:
+        values = driver.latencies.get(name, [])
+        if not values:
+            print(f"{name:<22} {0:>5} {driver.failures[name]:>5}")
+            continue
+        print(f"{name:<22} {len(values):>5} {driver.failures[name]:>5} "
+              f"{percentile(values, 0.5) * 1000:>9.1f} {percentile(values, 0.99) * 1000:>9.1f} "
+              f"{len(values) / elapsed:>8.2f}")
+    print(f"\nwall time {elapsed:.2f}s, upstream requests {server.upstream_requests}, "
+          f"Bot API calls {sum(server.api_calls.values())}")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Only the chart table is built into a tree on the BeautifulSoup path
+CHART_STRAINER = SoupStrainer('table', class_='chart-table')
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def _split_rows(header, cell_rows):
+    rows = []
+    for cells in cell_rows:
+        if len(cells) != len(header):
+            continue
+        rows.append((cells[0], tuple(cells[1:])))
+    return tuple(header), rows
+
+def _parse_chart_lxml(html):
+    tables = lxml.html.fromstring(html).xpath(f"//table[{_has_class('chart-table')}]")
+    if not tables:
+        return None
+    rows = [
+        [cell.text_content().strip() for cell in row.xpath('./th|./td')]
+        for row in tables[0].xpath('.//tr')
+    ]
+    if len(rows) < 3:
+        return (), []
+    return _split_rows(rows[1], rows[2:])
+
+def _parse_chart_soup(html):
+    soup = BeautifulSoup(html, 'html.parser', parse_only=CHART_STRAINER)
+    table = soup.find('table', class_='chart-table')
+    if not table:
+        return None
+    rows = [
+        [cell.text.strip() for cell in row.find_all(['th', 'td'])]
+        for row in table.find_all('tr')
+    ]
+    if len(rows) < 3:
+        return (), []
+    return _split_rows(rows[1], rows[2:])
+
+def parse_chart(html):
+    """Parse a chart.php page into (header, rows), or None if it has no chart table.
+
+    header is a tuple of column titles and rows is a list of (day, numbers) tuples.
+    """
+    if lxml is not None:
+        return _parse_chart_lxml(html)
+    return _parse_chart_soup(html)
+
+def _parse_homepage_lxml(html):
+    games = {}
+    for game_element in lxml.html.fromstring(html).xpath(f"//h3[{_has_class('game-name')}]"):
+        today = game_element.xpath(f"following::td[{_has_class('today-number')}][1]//h3[1]")
+        yesterday = game_element.xpath(f"following::td[{_has_class('yesterday-number')}][1]//h3[1]")
+        game_time = game_element.xpath(f"following::h3[{_has_class('game-time')}][1]")
+        games[game_element.text_content().strip()] = {
+            'today': today[0].text_content().strip() if today else None,
+            'yesterday': yesterday[0].text_content().strip() if yesterday else None,
+            'time': game_time[0].text_content().strip() if game_time else None,
+        }
+    return games
+
+def _text(element):
+    return element.text.strip() if element else None
+
+def _parse_homepage_soup(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    games = {}
+    for game_element in soup.find_all('h3', class_='game-name'):
+        today_cell = game_element.find_next('td', class_='today-number')
+        yesterday_cell = game_element.find_next('td', class_='yesterday-number')
+        games[game_element.text.strip()] = {
+            'today': _text(today_cell.find('h3')) if today_cell else None,
+            'yesterday': _text(yesterday_cell.find('h3')) if yesterday_cell else None,
+            'time': _text(game_element.find_next('h3', class_='game-time')),
+        }
+    return games
+
+def parse_homepage(html):
+    """Parse the homepage into {game name: {'today', 'yesterday', 'time'}}."""
+    if lxml is not None:
+        return _parse_homepage_lxml(html)
+    return _parse_homepage_soup(html)
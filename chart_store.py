@@ -0,0 +1,269 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+import pytz
+import requests
+import fetcher
+import chart_parser
+import db
+import history
+import metrics
+
+# Constants
+CHART_URL = fetcher.BASE_URL + "chart.php?month={month:02}&year={year}"
+TIMEZONE = 'Asia/Kolkata'
+FIRST_YEAR = 2015
+
+# How long the current month's chart is served before it is fetched again (seconds)
+CURRENT_MONTH_TTL = int(os.environ.get('CHART_TTL', 300))
+
+# A past month is only treated as closed once it was fetched this long after it ended,
+# so late results for the last day of the month are not frozen out of the store.
+CLOSE_GRACE_SECONDS = 24 * 60 * 60
+
+# Months being refreshed in the background
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+_lock = threading.Lock()
+_conn = db.connect()
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS charts ("
+    "year INTEGER NOT NULL, month INTEGER NOT NULL, "
+    "header TEXT NOT NULL, rows TEXT NOT NULL, fetched_at REAL NOT NULL, "
+    "PRIMARY KEY (year, month))"
+)
+_conn.commit()
+
+def _month_end(year, month):
+    """Timestamp of the first moment of the month after (year, month) in IST."""
+    ist = pytz.timezone(TIMEZONE)
+    if month == 12:
+        next_month = datetime(year + 1, 1, 1)
+    else:
+        next_month = datetime(year, month + 1, 1)
+    return ist.localize(next_month).timestamp()
+
+def current_month():
+    """Return (year, month) for today in IST."""
+    now = datetime.now(pytz.timezone(TIMEZONE))
+    return now.year, now.month
+
+def months_between(start, end):
+    """All (year, month) pairs from start to end inclusive, oldest first."""
+    year, month = start
+    months = []
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def last_months(count, end=None):
+    """The `count` calendar months up to and including end (default: this month), newest first."""
+    year, month = end or current_month()
+    months = []
+    for _ in range(count):
+        months.append((year, month))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return months
+
+def is_closed(year, month, fetched_at):
+    """Whether a month was fetched late enough after it ended that its chart is final."""
+    return fetched_at >= _month_end(year, month) + CLOSE_GRACE_SECONDS
+
+def is_fresh(year, month, fetched_at, now=None):
+    """Closed months never expire; the current month expires after CURRENT_MONTH_TTL."""
+    now = now or time.time()
+    if is_closed(year, month, fetched_at):
+        return True
+    return now - fetched_at < CURRENT_MONTH_TTL
+
+def load_month(year, month):
+    """Return the stored (header, rows, fetched_at) for a month, or None.
+
+    Rows are stored flat as [day, number, ...] and returned as (day, numbers) tuples.
+    """
+    with _lock:
+        row = _conn.execute(
+            "SELECT header, rows, fetched_at FROM charts WHERE year = ? AND month = ?",
+            (year, month)
+        ).fetchone()
+    if not row:
+        return None
+    return _decode(*row)
+
+def load_months(months):
+    """Return {(year, month): (header, rows, fetched_at)} for the stored months among `months`, in one query."""
+    if not months:
+        return {}
+    wanted = set(months)
+    years = [year for year, _ in wanted]
+    with _lock:
+        rows = _conn.execute(
+            "SELECT year, month, header, rows, fetched_at FROM charts WHERE year BETWEEN ? AND ?",
+            (min(years), max(years))
+        ).fetchall()
+    return {(year, month): _decode(*row) for year, month, *row in rows if (year, month) in wanted}
+
+def _decode(header, rows, fetched_at):
+    rows = [(cells[0], tuple(cells[1:])) for cells in json.loads(rows)]
+    return tuple(json.loads(header)), rows, fetched_at
+
+def save_month(year, month, header, rows, fetched_at=None):
+    fetched_at = fetched_at or time.time()
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO charts (year, month, header, rows, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (year, month, json.dumps(header), json.dumps([[day, *numbers] for day, numbers in rows]), fetched_at)
+        )
+        _conn.commit()
+    history.record_month(year, month, header, rows)
+
+def touch_month(year, month, fetched_at=None):
+    """Mark a stored month as fetched at fetched_at without rewriting its rows."""
+    with _lock:
+        _conn.execute(
+            "UPDATE charts SET fetched_at = ? WHERE year = ? AND month = ?",
+            (fetched_at or time.time(), year, month)
+        )
+        _conn.commit()
+
+def stored_months():
+    """Return every stored (year, month), oldest first."""
+    with _lock:
+        return _conn.execute("SELECT year, month FROM charts ORDER BY year, month").fetchall()
+
+def available_years():
+    """Years from FIRST_YEAR (or an older stored month) up to the current year.
+
+    The store only holds months that were looked up or backfilled, so every
+    year from FIRST_YEAR stays listed; older months fetch on demand.
+    """
+    with _lock:
+        (oldest,) = _conn.execute("SELECT MIN(year) FROM charts").fetchone()
+    return list(range(min(oldest or FIRST_YEAR, FIRST_YEAR), current_month()[0] + 1))
+
+def get_month(year, month):
+    """Return (header, rows, fetched_at) for a month, or None when the website has no chart table for it.
+
+    A stale stored copy is returned straight away while a single background
+    refresh fetches the month again; only months that were never stored are
+    fetched while the caller waits.
+    """
+    stored = load_month(year, month)
+    if stored:
+        if not is_fresh(year, month, stored[2]):
+            _refresh_in_background(year, month)
+        return stored
+
+    chart = refresh_month(year, month)
+    if chart is None:
+        return None
+    return chart[0], chart[1], time.time()
+
+def _refresh_in_background(year, month):
+    with _refreshing_lock:
+        if (year, month) in _refreshing:
+            return
+        _refreshing.add((year, month))
+
+    def run():
+        try:
+            refresh_month(year, month)
+        except Exception as e:
+            logging.error(f"Refreshing {month:02}-{year} failed: {str(e)}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard((year, month))
+
+    fetcher.fetch_pool.submit(run)
+
+def refresh_month(year, month):
+    """Fetch a month from the website now and store it if it has any rows.
+
+    When the page is the same as last time, the stored chart is only marked
+    fresh: it is not parsed again and the results index is not rewritten, so
+    caches keyed on the stored data stay valid.
+    """
+    url = CHART_URL.format(month=month, year=year)
+    stored = load_month(year, month)
+    response = fetcher.get(url, endpoint='chart', conditional=stored is not None)
+    if response.unchanged and stored:
+        touch_month(year, month)
+        return stored[0], stored[1]
+
+    try:
+        with metrics.parse_seconds.time(page='chart'):
+            chart = chart_parser.parse_chart(response.content)
+        if chart is None or not chart[1]:
+            # Don't store empty months, they are usually just not published yet
+            fetcher.forget(url)
+            return chart
+        save_month(year, month, *chart)
+    except Exception:
+        # Nothing was stored, so the same page must not count as unchanged next time
+        fetcher.forget(url)
+        raise
+    return chart
+
+def plan_months(months):
+    """Split (year, month) pairs into the months already fresh in the store and the ones to fetch.
+
+    Returns ({(year, month): (header, rows)}, [(year, month), ...]). Duplicates are
+    dropped and the months to fetch keep the requested order.
+    """
+    months = list(dict.fromkeys(months))
+    stored = load_months(months)
+    cached = {}
+    missing = []
+    for pair in months:
+        entry = stored.get(pair)
+        if entry and is_fresh(*pair, entry[2]):
+            cached[pair] = entry[:2]
+        else:
+            missing.append(pair)
+    return cached, missing
+
+def iter_months(months, plan=None):
+    """Yield ((year, month), chart, error) for each month as soon as it is available.
+
+    Months already fresh in the store come first, the rest in the order their
+    fetches finish. A month that could not be fetched is yielded with its error
+    instead of stopping the others.
+    """
+    cached, missing = plan or plan_months(months)
+    for pair, chart in cached.items():
+        yield pair, chart, None
+    yield from fetcher.fetch_each(lambda pair: _refresh_or_stored(*pair), missing)
+
+def _refresh_or_stored(year, month):
+    """Refresh a month, falling back to its stale stored copy when the website fails."""
+    try:
+        return refresh_month(year, month)
+    except requests.exceptions.RequestException as e:
+        stored = load_month(year, month)
+        if not stored:
+            raise
+        logging.warning(f"Using the stored copy of {month:02}-{year}: {str(e)}")
+        return stored[0], stored[1]
+
+@lru_cache(maxsize=256)
+def chart_csv(header, rows):
+    """Serialize a month's chart to CSV bytes; repeat calls for unchanged rows are cached."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=',')
+    writer.writerow(header)
+    writer.writerows([day, *numbers] for day, numbers in rows)
+    return buffer.getvalue().encode('utf-8')
+
+# Fill the results index from months stored before it existed
+if history.is_empty():
+    for stored_year, stored_month in stored_months():
+        stored_header, stored_rows, _ = load_month(stored_year, stored_month)
+        history.record_month(stored_year, stored_month, stored_header, stored_rows)
@@ -0,0 +1,15 @@
+import os
+import sqlite3
+
+# Local SQLite file shared by every thread and worker process of the bot
+DB_PATH = os.environ.get('CHART_DB', 'satta_charts.db')
+
+def connect(path=DB_PATH):
+    """Open a SQLite connection that several threads and worker processes can share.
+
+    WAL mode lets readers in other processes keep going while one of them writes.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,75 @@
+import io
+import os
+import time
+import logging
+import hashlib
+import threading
+from telebot.apihelper import ApiTelegramException
+import db
+
+# Constants
+# Least recently used file_ids beyond this many are dropped
+MAX_FILE_IDS = int(os.environ.get('MAX_FILE_IDS', 10000))
+
+# Telegram file_id of every document already uploaded, keyed by content hash
+_lock = threading.Lock()
+_conn = db.connect()
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS file_ids (content_hash TEXT PRIMARY KEY, file_id TEXT NOT NULL)"
+)
+if 'used_at' not in [row[1] for row in _conn.execute("PRAGMA table_info(file_ids)")]:
+    _conn.execute("ALTER TABLE file_ids ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+_conn.commit()
+
+def content_hash(data, file_name):
+    digest = hashlib.sha256(data)
+    digest.update(file_name.encode('utf-8'))
+    return digest.hexdigest()
+
+def get_file_id(key):
+    with _lock:
+        row = _conn.execute("SELECT file_id FROM file_ids WHERE content_hash = ?", (key,)).fetchone()
+        if row:
+            _conn.execute("UPDATE file_ids SET used_at = ? WHERE content_hash = ?", (time.time(), key))
+            _conn.commit()
+    return row[0] if row else None
+
+def save_file_id(key, file_id):
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO file_ids (content_hash, file_id, used_at) VALUES (?, ?, ?)",
+            (key, file_id, time.time())
+        )
+        _conn.execute(
+            "DELETE FROM file_ids WHERE content_hash NOT IN "
+            "(SELECT content_hash FROM file_ids ORDER BY used_at DESC LIMIT ?)",
+            (MAX_FILE_IDS,)
+        )
+        _conn.commit()
+
+def forget_file_id(key):
+    with _lock:
+        _conn.execute("DELETE FROM file_ids WHERE content_hash = ?", (key,))
+        _conn.commit()
+
+def send_document(outbox, chat_id, data, file_name, key=None):
+    """Send a generated file through the outbox, reusing Telegram's file_id when the same content was uploaded before.
+
+    The content is identified by a hash of data unless `key` is given. Pass a
+    key describing the data behind files whose bytes change from one build to
+    the next, like .xlsx files, which carry their creation time.
+    """
+    key = content_hash(data if key is None else key.encode('utf-8'), file_name)
+    file_id = get_file_id(key)
+    if file_id:
+        try:
+            return outbox.send_document(chat_id, file_id).result()
+        except ApiTelegramException as e:
+            # The file_id is no longer valid for this bot, upload again
+            logging.warning(f"Cached file_id rejected, uploading {file_name} again: {str(e)}")
+            forget_file_id(key)
+
+    sent_message = outbox.send_document(chat_id, io.BytesIO(data), visible_file_name=file_name).result()
+    if sent_message and sent_message.document:
+        save_file_id(key, sent_message.document.file_id)
+    return sent_message
@@ -0,0 +1,58 @@
+import io
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
+
+# Styles shared by every export
+HEADER_FONT = Font(size=12, bold=True)
+HEADER_FILL = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='solid')
+YELLOW_FILL = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+COLUMN_WIDTH = 15
+ROW_HEIGHT = 17
+
+def build_chart_workbook(title, headers, month_charts, highlight=None):
+    """Stream a multi-month chart workbook into memory and return the .xlsx bytes.
+
+    month_charts is an iterable of ((year, month), rows) with rows as (day, numbers)
+    tuples. Rows are written out as they are produced (openpyxl write-only mode),
+    so the workbook is never held in memory as a whole.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    for col_num in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = COLUMN_WIDTH
+
+    header_cells = []
+    for value in headers:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        header_cells.append(cell)
+    ws.append(header_cells)
+    row_idx = 1
+
+    for (year, month), rows in month_charts:
+        # Add month-year title row
+        ws.append([datetime(year, month, 1).strftime('%B-%Y')])
+        row_idx += 1
+
+        for day, numbers in rows:
+            row_data = [day, *numbers]
+            if highlight:
+                # Highlight every game that had the number that day, not just the first
+                for col_num, value in enumerate(numbers, start=1):  # +1 because 1st column is date
+                    if value == highlight:
+                        cell = WriteOnlyCell(ws, value=value)
+                        cell.fill = YELLOW_FILL
+                        row_data[col_num] = cell
+
+            row_idx += 1
+            ws.row_dimensions[row_idx].height = ROW_HEIGHT
+            ws.append(row_data)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+import metrics
+
+# Constants
+BASE_URL = os.environ.get('SATTA_BASE_URL', 'https://satta-king-fast.com/')
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 8))
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 15))
+CONNECT_TIMEOUT = 3.05
+
+# Read timeout per endpoint (seconds); the homepage is small and users wait on it
+ENDPOINT_TIMEOUTS = {
+    'homepage': float(os.environ.get('HOMEPAGE_TIMEOUT', 5)),
+    'chart': float(os.environ.get('CHART_TIMEOUT', 10)),
+}
+
+# Stop calling the website after this many failures in a row, for this many seconds
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.environ.get('BREAKER_RESET', 30))
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling the website while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Fails calls at once while the website keeps failing.
+
+    Opens after `threshold` failures in a row. After `reset_after` seconds a
+    single trial call is let through: success closes the breaker again,
+    failure keeps it open for another `reset_after` seconds.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_after:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+
+# One keep-alive session shared by every request to the website, with enough
+# pooled connections for all fetch workers to run at the same time.
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_WORKERS)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+# gzip/deflate, plus brotli when the brotli package is installed
+session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+# ETag, Last-Modified and body hash of the last full response for each URL
+_validators = {}
+_validators_lock = threading.Lock()
+
+# Bounded worker pool used to fetch many pages in parallel
+fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+def get(url, endpoint='page', conditional=False):
+    """GET a page through the shared session and raise on HTTP errors.
+
+    Raises CircuitOpenError without calling the website while the breaker is open.
+
+    response.unchanged is True when the body is the same as the last time url
+    was fetched. With conditional=True the request carries If-None-Match /
+    If-Modified-Since, and a 304 comes back as an unchanged response without a
+    body, so only pass it when the caller still has the previous result.
+    Callers that fail to store a changed response must forget(url).
+    """
+    with _validators_lock:
+        etag, last_modified, body_hash = _validators.get(url, (None, None, None))
+    headers = {}
+    if conditional:
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    if not breaker.allow():
+        metrics.upstream_short_circuits.inc(endpoint=endpoint)
+        raise CircuitOpenError(f"{BASE_URL} keeps failing, not calling it for now")
+
+    timeout = (CONNECT_TIMEOUT, ENDPOINT_TIMEOUTS.get(endpoint, REQUEST_TIMEOUT))
+    with metrics.upstream_seconds.time(endpoint=endpoint):
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            metrics.upstream_errors.inc(endpoint=endpoint)
+            # A 4xx still means the website is up
+            if e.response is not None and e.response.status_code < 500:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            raise
+    breaker.record_success()
+
+    if response.status_code == 304:
+        response.unchanged = True
+    else:
+        new_hash = hashlib.sha256(response.content).hexdigest()
+        response.unchanged = new_hash == body_hash
+        with _validators_lock:
+            _validators[url] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), new_hash)
+    if response.unchanged:
+        metrics.upstream_unchanged.inc(endpoint=endpoint)
+    return response
+
+def forget(url):
+    """Drop the validators of url, so its next response counts as changed."""
+    with _validators_lock:
+        _validators.pop(url, None)
+
+def fetch_each(func, items):
+    """Run func over items on the fetch pool, yielding (item, result, error) as each one finishes."""
+    futures = {fetch_pool.submit(func, item): item for item in items}
+    for future in as_completed(futures):
+        error = future.exception()
+        yield futures[future], None if error else future.result(), error
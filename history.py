@@ -0,0 +1,97 @@
+import threading
+from datetime import date
+import db
+
+# Every published result as one (date, game, number) row, indexed by number
+_lock = threading.Lock()
+_conn = db.connect()
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS results ("
+    "date TEXT NOT NULL, game TEXT NOT NULL, number TEXT NOT NULL, "
+    "PRIMARY KEY (date, game))"
+)
+_conn.execute("CREATE INDEX IF NOT EXISTS results_by_number ON results (number, date)")
+# A single counter bumped by every write, so readers can tell when results changed
+_conn.execute("CREATE TABLE IF NOT EXISTS results_version (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)")
+_conn.execute("INSERT OR IGNORE INTO results_version (id, version) VALUES (0, 0)")
+_conn.commit()
+
+def normalize_number(value):
+    """Return a result as two digits ('7' -> '07'), or None if it is not a number (e.g. 'XX')."""
+    value = (value or '').strip()
+    if not value.isdigit() or int(value) > 99:
+        return None
+    return f"{int(value):02d}"
+
+def month_results(year, month, header, rows):
+    """Turn one month's chart into (date, game, number) rows."""
+    results = []
+    for day, numbers in rows:
+        try:
+            day_date = date(year, month, int(day))
+        except ValueError:
+            continue
+        for game, value in zip(header[1:], numbers):
+            number = normalize_number(value)
+            if number is not None:
+                results.append((day_date.isoformat(), game, number))
+    return results
+
+def record_month(year, month, header, rows):
+    """Replace the stored results of one month."""
+    first = date(year, month, 1).isoformat()
+    last = date(year + month // 12, month % 12 + 1, 1).isoformat()
+    with _lock:
+        _conn.execute("DELETE FROM results WHERE date >= ? AND date < ?", (first, last))
+        _conn.executemany(
+            "INSERT OR REPLACE INTO results (date, game, number) VALUES (?, ?, ?)",
+            month_results(year, month, header, rows)
+        )
+        _conn.execute("UPDATE results_version SET version = version + 1 WHERE id = 0")
+        _conn.commit()
+
+def is_empty():
+    with _lock:
+        return _conn.execute("SELECT 1 FROM results LIMIT 1").fetchone() is None
+
+def lookup(number, since=None, today=None):
+    """Every appearance of a number with per-game counts, last-seen date and gap statistics.
+
+    Gaps are the number of days between consecutive appearances (in any game).
+    Returns None if the number is not valid.
+    """
+    number = normalize_number(number)
+    if number is None:
+        return None
+    with _lock:
+        occurrences = _conn.execute(
+            "SELECT date, game FROM results WHERE number = ? AND date >= ? ORDER BY date, game",
+            (number, since.isoformat() if since else '')
+        ).fetchall()
+
+    counts = {}
+    for _, game in occurrences:
+        counts[game] = counts.get(game, 0) + 1
+
+    days = sorted({date.fromisoformat(day) for day, _ in occurrences})
+    gaps = [(later - earlier).days for earlier, later in zip(days, days[1:])]
+    today = today or date.today()
+    return {
+        'number': number,
+        'occurrences': occurrences,
+        'counts': counts,
+        'last_seen': occurrences[-1] if occurrences else None,
+        'days_since_last': (today - days[-1]).days if days else None,
+        'average_gap': sum(gaps) / len(gaps) if gaps else None,
+        'longest_gap': max(gaps) if gaps else None,
+    }
+
+def all_results():
+    """Every stored (date, game, number), oldest first."""
+    with _lock:
+        return _conn.execute("SELECT date, game, number FROM results ORDER BY date, game").fetchall()
+
+def data_version():
+    """Changes whenever a month of results is written, in this or any other process."""
+    with _lock:
+        return _conn.execute("SELECT version FROM results_version WHERE id = 0").fetchone()[0]
@@ -0,0 +1,111 @@
+import os
+import time
+import logging
+import threading
+import fetcher
+import chart_parser
+import shared_state
+import metrics
+
+# Constants
+URL = fetcher.BASE_URL
+
+# How long a homepage snapshot is served before it is fetched again (seconds)
+SNAPSHOT_TTL = int(os.environ.get('HOME_TTL', 30))
+
+# Latest snapshot as (fetched_at, games); replaced as a whole, never mutated
+_snapshot = None
+_refresh_lock = threading.Lock()
+_listeners = []
+
+def on_publish(listener):
+    """Register listener(previous_games, games) to be called whenever a parsed snapshot is published.
+
+    previous_games is the snapshot being replaced, as stored by any worker
+    process, or None when there was none.
+    """
+    _listeners.append(listener)
+    return listener
+
+def refresh():
+    """Fetch the homepage now and publish it as the current snapshot.
+
+    An unchanged page is not parsed again; the current snapshot is only marked fresh.
+    """
+    global _snapshot
+    previous = _snapshot
+    response = fetcher.get(URL, endpoint='homepage', conditional=previous is not None)
+    if response.unchanged and previous:
+        _snapshot = (time.time(), previous[1])
+        shared_state.touch_snapshot('homepage', _snapshot[0])
+        return previous[1]
+
+    try:
+        with metrics.parse_seconds.time(page='homepage'):
+            games = chart_parser.parse_homepage(response.content)
+        replaced = shared_state.load_snapshot('homepage')
+        fetched_at = time.time()
+        shared_state.save_snapshot('homepage', games, fetched_at)
+    except Exception:
+        # Nothing was published, so the same page must not count as unchanged next time
+        fetcher.forget(URL)
+        raise
+    _snapshot = (fetched_at, games)
+    for listener in _listeners:
+        try:
+            listener(replaced and replaced[1], games)
+        except Exception as e:
+            logging.error(f"Homepage listener error: {str(e)}")
+    return games
+
+def get_snapshot():
+    """Return the homepage games, serving a stale snapshot while it is refreshed in the background.
+
+    A snapshot older than SNAPSHOT_TTL is returned straight away and a single
+    background refresh is started, so users never wait on a slow or failing
+    website. A fresher snapshot saved by another worker process is picked up
+    first. Only when there is no snapshot at all does the caller wait for the
+    website.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot and time.time() - snapshot[0] < SNAPSHOT_TTL:
+        return snapshot[1]
+
+    shared = shared_state.load_snapshot('homepage')
+    if shared and (not snapshot or shared[0] > snapshot[0]):
+        _snapshot = snapshot = shared
+        if time.time() - shared[0] < SNAPSHOT_TTL:
+            return shared[1]
+
+    if snapshot:
+        _refresh_in_background()
+        return snapshot[1]
+
+    with _refresh_lock:
+        if _snapshot:
+            return _snapshot[1]
+        return refresh()
+
+def _refresh_in_background():
+    if not _refresh_lock.acquire(blocking=False):
+        return  # A refresh is already running
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logging.error(f"Homepage refresh failed: {str(e)}")
+        finally:
+            _refresh_lock.release()
+
+    fetcher.fetch_pool.submit(run)
+
+def age():
+    """Seconds since the snapshot being served was fetched, or None before the first one."""
+    snapshot = _snapshot
+    return time.time() - snapshot[0] if snapshot else None
+
+def get_game(name):
+    """Return the snapshot entry for one game, or None if it is not on the homepage."""
+    return get_snapshot().get(name)
@@ -1,5 +1,6 @@
-from flask import Flask,render_template
+from flask import Flask,render_template,Response
 from threading import Thread
+import metrics
 
 app = Flask(__name__)
 
@@ -7,6 +8,10 @@ app = Flask(__name__)
 def index():
     return "url"
 
+@app.route('/metrics')
+def metrics_view():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 def run():
     app.run(host='0.0.0.0', port=10000)
 
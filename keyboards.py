@@ -0,0 +1,14 @@
+import threading
+
+# Inline keyboards are built and serialized once, then reused as JSON for every reply
+_lock = threading.Lock()
+_markups = {}
+
+def get(key, build):
+    """Return the reply_markup JSON registered under key, calling build() only the first time."""
+    markup = _markups.get(key)
+    if markup is None:
+        markup = build().to_json()
+        with _lock:
+            markup = _markups.setdefault(key, markup)
+    return markup
@@ -1,14 +1,26 @@
 import os
+import time
 import requests
-from bs4 import BeautifulSoup
 import telebot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pytz
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 import logging
-import csv
+import analytics
+import artifact_cache
+import chart_store
+import documents
+import fetcher
+import history
+import homepage
+import keyboards
+import metrics
+import poller
+from outbox import Outbox
+from router import CallbackRouter, one_of
+from session_store import sessions
+import subscriptions
+import workers
 from keep_alive import keep_alive
 
 keep_alive()
@@ -22,11 +34,24 @@ if not TOKEN:
     raise ValueError("Bot token not set in environment variables. Please set the 'TOKEN' variable.")
 
 bot = telebot.TeleBot(TOKEN)
+metrics.instrument_telegram()
+outbox = Outbox(bot)
 
 # Constants
-URL = "https://satta-king-fast.com/"
 TIMEZONE = 'Asia/Kolkata'
 
+# Shown to users instead of exception details, which only go to the log
+UPSTREAM_ERROR_MESSAGE = "The results website is not responding right now. Please try again in a few minutes."
+GENERIC_ERROR_MESSAGE = "Something went wrong, please try again."
+
+# A stale copy is only pointed out once it is this old (seconds), or while the website is failing;
+# between draws the poller refreshes every 10 minutes, so younger copies are normal
+STALE_NOTE_AGE = 15 * 60
+
+# Multi-month exports: seconds between progress edits, and failed months listed by name
+PROGRESS_INTERVAL = 1.0
+MAX_LISTED_FAILURES = 10
+
 # Emoji constants
 EMOJI_CALENDAR = '📅'
 EMOJI_ROBOT = '🤖'
@@ -42,8 +67,92 @@ GAME_NAMES = {
     'GALI': {'name': 'GALI', 'emoji': '🎲'},
 }
 
-# Dictionary to store user data
-user_data = {}
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+MONTH_RANGES = range(6, 121, 6)
+
+# Keyboard builders; each markup is built once and reused through keyboards.get
+def start_keyboard():
+    markup = InlineKeyboardMarkup(row_width=2)
+    markup.add(
+        InlineKeyboardButton("Get Chart 📊", callback_data='chart'),
+        InlineKeyboardButton("Get Prediction 🔮", callback_data='predict'),
+        InlineKeyboardButton("Check My Number 🔍", callback_data='checkmynumber'),
+        InlineKeyboardButton("Close 🛑", callback_data='close')
+    )
+    return markup
+
+def year_keyboard(years):
+    markup = InlineKeyboardMarkup(row_width=3)
+    markup.add(*[InlineKeyboardButton(str(year), callback_data=f"year_{year}") for year in years])
+    markup.add(
+        InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data='back_to_start'),
+        InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
+    )
+    return markup
+
+def month_keyboard(year):
+    markup = InlineKeyboardMarkup(row_width=3)
+    markup.add(*[InlineKeyboardButton(month, callback_data=f"month_{month.lower()}_{year}") for month in MONTH_NAMES])
+    markup.add(
+        InlineKeyboardButton(f"{EMOJI_BACK} Back to Year Selection", callback_data="back_to_year_selection"),
+        InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
+    )
+    return markup
+
+def predict_keyboard():
+    markup = InlineKeyboardMarkup(row_width=2)
+    markup.add(*[
+        InlineKeyboardButton(game_info['name'], callback_data=f'predict_{code}')
+        for code, game_info in GAME_NAMES.items()
+    ])
+    markup.add(
+        InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data='back_to_start'),
+        InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
+    )
+    return markup
+
+def prediction_keyboard(game_code, latest_number):
+    markup = InlineKeyboardMarkup(row_width=2)
+    markup.add(
+        InlineKeyboardButton(f"Check Chart {latest_number} 🎲", callback_data="show_latest_number"),
+        InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data="back_to_start")
+    )
+    markup.add(
+        InlineKeyboardButton("Stats 📈", callback_data=f"stats_{game_code}"),
+        InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data="close")
+    )
+    return markup
+
+def range_keyboard(callback_prefix, last_button):
+    markup = InlineKeyboardMarkup(row_width=3)
+    markup.add(*[
+        InlineKeyboardButton(f"{months} months", callback_data=f"{callback_prefix}_{months}")
+        for months in MONTH_RANGES
+    ])
+    markup.add(last_button)
+    return markup
+
+def back_close_keyboard(back_text, back_data):
+    markup = InlineKeyboardMarkup(row_width=2)
+    markup.add(
+        InlineKeyboardButton(f"{EMOJI_BACK} {back_text}", callback_data=back_data),
+        InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
+    )
+    return markup
+
+
+def find_game_code(text):
+    """Game code for a code or display name typed by the user, or None."""
+    text = (text or '').strip().upper()
+    for code, game_info in GAME_NAMES.items():
+        if text in (code, game_info['name']):
+            return code
+    return None
+
+def get_menu_message_id(message):
+    """Id of the chat's menu message, falling back to the message the button was pressed on."""
+    return sessions.get(message.chat.id).message_id or message.message_id
 
 def get_current_time():
     """Get current date and time in IST."""
@@ -52,6 +161,20 @@ def get_current_time():
     ist_now = utc_now.astimezone(ist)
     return ist_now
 
+def user_error_message(error):
+    """What to tell the user about a failed request."""
+    if isinstance(error, requests.exceptions.RequestException):
+        return UPSTREAM_ERROR_MESSAGE
+    return GENERIC_ERROR_MESSAGE
+
+def stale_note(age, stale):
+    """A line telling the user how old the data shown is, or '' unless an old or failing copy is being refreshed."""
+    if not stale or (age < STALE_NOTE_AGE and not fetcher.breaker.failures):
+        return ''
+    minutes = max(1, int(age // 60))
+    text = f"{minutes} min" if minutes < 120 else f"{minutes // 60} h"
+    return f"\n\n⏳ Last updated {text} ago, refreshing in the background."
+
 # Start command handler
 @bot.message_handler(commands=['start'])
 def send_start(message):
@@ -67,21 +190,59 @@ def send_start(message):
         #f"📅 Current Date & Time: *{ist_formatted}*"
     )
 
-    markup = InlineKeyboardMarkup(row_width=2)
-    buttons = [
-        InlineKeyboardButton("Get Chart 📊", callback_data='chart'),
-        InlineKeyboardButton("Get Prediction 🔮", callback_data='predict'),
-        InlineKeyboardButton("Check My Number 🔍", callback_data='checkmynumber'),
-        InlineKeyboardButton("Close 🛑", callback_data='close')
-    ]
-    markup.add(*buttons)
-
-    sent_message = bot.send_message(message.chat.id, welcome_message, parse_mode='Markdown', reply_markup=markup)
-    user_data[message.chat.id] = {"message_id": sent_message.message_id}
+    markup = keyboards.get('start', start_keyboard)
+    sent_message = outbox.send_message(message.chat.id, welcome_message, parse_mode='Markdown', reply_markup=markup).result()
+    sessions.update(message.chat.id, message_id=sent_message.message_id)
+
+# Subscribe command handler
+@bot.message_handler(commands=['subscribe'])
+def handle_subscribe(message):
+    args = message.text.split(maxsplit=1)
+    code = find_game_code(args[1]) if len(args) > 1 else None
+    if code is None:
+        games = ', '.join(f"{code} ({game_info['name']})" for code, game_info in GAME_NAMES.items())
+        subscribed = ', '.join(subscriptions.games_of(message.chat.id)) or 'none'
+        outbox.send_message(message.chat.id, f"Usage: /subscribe <game>\nGames: {games}\nYour subscriptions: {subscribed}")
+        return
+
+    game_name = GAME_NAMES[code]['name']
+    if subscriptions.subscribe(message.chat.id, code):
+        reply = f"{EMOJI_SUCCESS} You will get the {game_name} result as soon as it is out. Use /unsubscribe {code} to stop."
+    else:
+        reply = f"You are already subscribed to {game_name}."
+    outbox.send_message(message.chat.id, reply)
+
+# Unsubscribe command handler
+@bot.message_handler(commands=['unsubscribe'])
+def handle_unsubscribe(message):
+    args = message.text.split(maxsplit=1)
+    if len(args) == 1:
+        subscriptions.unsubscribe(message.chat.id)
+        outbox.send_message(message.chat.id, "You are unsubscribed from all results.")
+        return
+
+    code = find_game_code(args[1])
+    if code is None:
+        outbox.send_message(message.chat.id, "Unknown game. Use /unsubscribe <game>, or /unsubscribe to stop all results.")
+        return
+    subscriptions.unsubscribe(message.chat.id, code)
+    outbox.send_message(message.chat.id, f"You are unsubscribed from {GAME_NAMES[code]['name']} results.")
+
+# Sent to subscribers once the poller sees a new result
+@poller.on_result
+def announce_result(game_name, number):
+    code = find_game_code(game_name)
+    if code is None:
+        return
+    text = (
+        f"{EMOJI_SUCCESS} {game_name} result is out: {number} {GAME_NAMES[code]['emoji']}\n\n"
+        f"Use /unsubscribe {code} to stop these messages."
+    )
+    workers.run_in_background(subscriptions.broadcast, outbox, code, text)
 
 # Update message with new content and markup
 def update_message(chat_id, message_id, new_text, new_markup):
-    bot.edit_message_text(new_text, chat_id, message_id, reply_markup=new_markup, parse_mode='Markdown')
+    outbox.edit_message_text(new_text, chat_id, message_id, reply_markup=new_markup, parse_mode='Markdown')
 
 # Chart button handler
 def handle_chart(message):
@@ -93,15 +254,10 @@ def handle_chart(message):
         f"Please select the year for\nwhich you want the chart data:"
     )
 
-    markup = InlineKeyboardMarkup(row_width=3)
-    years = [str(year) for year in range(2015, 2025)]
-    year_buttons = [InlineKeyboardButton(year, callback_data=f"year_{year}") for year in years]
-    back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data='back_to_start')
-    close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-    markup.add(*year_buttons)
-    markup.add(back_button, close_button)
+    years = chart_store.available_years()
+    markup = keyboards.get(('years', years[0], years[-1]), lambda: year_keyboard(years))
 
-    update_message(message.chat.id, user_data[message.chat.id]["message_id"], chart_message, markup)
+    update_message(message.chat.id, get_menu_message_id(message), chart_message, markup)
 
 # Predict button handler
 def handle_predict(message):
@@ -116,193 +272,128 @@ def handle_predict(message):
         "Please select which game's prediction you want:"
     )
 
-    markup = InlineKeyboardMarkup(row_width=2)
-    game_buttons = [
-        InlineKeyboardButton(game_info['name'], callback_data=f'predict_{code}')
-        for code, game_info in GAME_NAMES.items()
-    ]
-    back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data='back_to_start')
-    close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-    markup.add(*game_buttons)
-    markup.add(back_button, close_button)
+    markup = keyboards.get('predict', predict_keyboard)
 
-    update_message(message.chat.id, user_data[message.chat.id]["message_id"], predict_message, markup)
+    update_message(message.chat.id, get_menu_message_id(message), predict_message, markup)
 
 # Check My Number button handler
 def handle_checkmynumber(message):
     number_prompt = "Tell me your number (between 00 and 99):"
 
-    markup = InlineKeyboardMarkup()
-    back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data='back_to_start')
-    close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-    markup.add(back_button, close_button)
+    markup = keyboards.get('back_to_start', lambda: back_close_keyboard("Back", 'back_to_start'))
 
-    sent_message = bot.edit_message_text(number_prompt, message.chat.id, user_data[message.chat.id]["message_id"], reply_markup=markup)
-    bot.register_next_step_handler(sent_message, get_user_number)
+    # The next message from this chat is the number; kept in the session so any worker can pick it up
+    sessions.update(message.chat.id, awaiting_number=True)
+    outbox.edit_message_text(number_prompt, message.chat.id, get_menu_message_id(message), reply_markup=markup)
 
+@bot.message_handler(func=lambda message: sessions.get(message.chat.id).awaiting_number)
 def get_user_number(message):
+    sessions.update(message.chat.id, awaiting_number=False)
     try:
         user_number = message.text.strip()
         if user_number.isdigit() and 0 <= int(user_number) <= 99:
-            user_data[message.chat.id] = {"number": user_number}
-
-            markup = InlineKeyboardMarkup(row_width=3)
-            months_buttons = [
-                InlineKeyboardButton(f"{months} months", callback_data=f"number_months_{months}")
-                for months in range(6, 121, 6)
-            ]
-            close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-            markup.add(*months_buttons)
-            markup.add(close_button)
-
-            bot.send_message(message.chat.id, "Select range for chart detail:", reply_markup=markup)
+            sessions.update(message.chat.id, number=f"{int(user_number):02d}")
+            markup = keyboards.get('number_months', lambda: range_keyboard(
+                'number_months', InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')))
+            outbox.send_message(message.chat.id, "Select range for chart detail:", reply_markup=markup)
         else:
             skip_message = "Invalid number provided. Skipping this task. You can try again using the buttons below."
-            bot.send_message(message.chat.id, skip_message)
+            outbox.send_message(message.chat.id, skip_message)
             send_start(message)  # Re-initiate the start command
     except Exception as e:
         logging.error(f"Error: {str(e)}")
         skip_message = "An error occurred. Skipping this task."
-        bot.send_message(message.chat.id, skip_message)
+        outbox.send_message(message.chat.id, skip_message)
         send_start(message)  # Re-initiate the start command
 
+# Callback routing table
+router = CallbackRouter(bot, outbox)
+router.exact('chart', lambda call: handle_chart(call.message))
+router.exact('predict', lambda call: handle_predict(call.message))
+router.exact('checkmynumber', lambda call: handle_checkmynumber(call.message))
+router.exact('close', lambda call: outbox.delete_message(call.message.chat.id, call.message.message_id))
+router.exact('back_to_start', lambda call: back_to_start(call.message))
+router.exact('show_latest_number', lambda call: show_latest_number(call))
+router.exact('back_to_year_selection', lambda call: handle_chart(call.message))
+router.prefix('year', lambda call, year: show_month_selection(call.message, year), one_of(chart_store.available_years))
+router.prefix('month', lambda call, month, year: process_month_selection(call, month, year), str, one_of(chart_store.available_years))
+router.prefix('predict', lambda call, game_code: handle_prediction_query(call, game_code), str)
+router.prefix('stats', lambda call, game_code: handle_stats_query(call, game_code), str)
+router.prefix('months', lambda call, months: handle_months_selection(call, months), one_of(MONTH_RANGES))
+router.prefix('number_months', lambda call, months: handle_number_months_selection(call, months), one_of(MONTH_RANGES))
+
 # Callback query handler
 @bot.callback_query_handler(func=lambda call: True)
 def handle_callback(call):
-    try:
-        if call.data == 'chart':
-            handle_chart(call.message)
-        elif call.data == 'predict':
-            handle_predict(call.message)
-        elif call.data == 'checkmynumber':
-            handle_checkmynumber(call.message)
-        elif call.data == 'close':
-            bot.delete_message(call.message.chat.id, call.message.message_id)
-        elif call.data == 'back_to_start':
-            #send_start(call.message)
-            bot.delete_message(call.message.chat.id, call.message.message_id)
-            send_start(call.message)
-        elif call.data.startswith('year_'):
-            year = call.data.split('_')[1]
-            show_month_selection(call.message, year)
-        elif call.data.startswith('month_'):
-            process_month_selection(call)
-        elif call.data.startswith('predict_'):
-            handle_prediction_query(call)
-        elif call.data == 'show_latest_number':
-            show_latest_number(call)
-        elif call.data.startswith('months_'):
-            handle_months_selection(call)
-        elif call.data.startswith('number_months_'):
-            handle_number_months_selection(call)
-        elif call.data == 'back_to_year_selection':
-            handle_chart(call.message)
-    except Exception as e:
-        logging.error(f"Callback error: {str(e)}")
+    router.dispatch(call)
+
+def back_to_start(message):
+    outbox.delete_message(message.chat.id, message.message_id)
+    send_start(message)
 
 def show_month_selection(message, year):
-    markup = InlineKeyboardMarkup(row_width=3)
-    months = ["January", "February", "March", "April", "May", "June",
-              "July", "August", "September", "October", "November", "December"]
-    buttons = [InlineKeyboardButton(month, callback_data=f"month_{month.lower()}_{year}") for month in months]
-    back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back to Year Selection", callback_data="back_to_year_selection")
-    close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-    markup.add(*buttons)
-    markup.add(back_button, close_button)
-    bot.edit_message_text(f"Select the month for {year}:", message.chat.id, user_data[message.chat.id]["message_id"], reply_markup=markup)
-
-def process_month_selection(call):
-    month, year = call.data.split('_')[1:]
+    markup = keyboards.get(('year', year), lambda: month_keyboard(year))
+    outbox.edit_message_text(f"Select the month for {year}:", message.chat.id, get_menu_message_id(message), reply_markup=markup)
+
+def process_month_selection(call, month, year):
     month_number = {
         "january": "01", "february": "02", "march": "03", "april": "04", "may": "05", "june": "06",
         "july": "07", "august": "08", "september": "09", "october": "10", "november": "11", "december": "12"
     }[month]
 
-    url = f"https://satta-king-fast.com/chart.php?month={month_number}&year={year}"
-
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        table = soup.find('table', class_='chart-table')
-        if not table:
-            bot.send_message(call.message.chat.id, f"No data found for {month.capitalize()} {year}")
+        with metrics.stage('month_chart', 'scrape'):
+            chart = chart_store.get_month(int(year), int(month_number))
+        if chart is None:
+            outbox.send_message(call.message.chat.id, f"No data found for {month.capitalize()} {year}")
             return
 
-        rows = table.find_all('tr')
-        if not rows or len(rows) < 3:
-            bot.send_message(call.message.chat.id, f"No data available in the table for {month.capitalize()} {year}")
+        header, data, fetched_at = chart
+        if not header:
+            outbox.send_message(call.message.chat.id, f"No data available in the table for {month.capitalize()} {year}")
             return
 
-        header = [cell.text.strip() for cell in rows[1].find_all(['th', 'td'])]
-        data = []
-
-        for row in rows[2:]:
-            cells = row.find_all(['th', 'td'])
-            if len(cells) != len(header):
-                continue
-            date = cells[0].text.strip()
-            values = [cell.text.strip() for cell in cells[1:]]
-            data.append([date] + values)
-
         if not data:
-            bot.send_message(call.message.chat.id, f"No data rows found for {month.capitalize()} {year}")
+            outbox.send_message(call.message.chat.id, f"No data rows found for {month.capitalize()} {year}")
             return
 
         filename = f"Satta_King_Chart_{month.capitalize()}_{year}.csv"
-        with open(filename, mode='w', newline='') as file:
-            writer = csv.writer(file, delimiter=',')
-            writer.writerow(header)
-            writer.writerows(data)
-
-        with open(filename, 'r') as file:
-            csv_data = file.read()
-            formatted_data = format_chart_data(csv_data)
-            chart_message = f"Here is the Satta King Chart for {month.capitalize()} {year}:\n\n{formatted_data}"
-            back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back to Year Selection", callback_data="back_to_year_selection")
-            close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data='close')
-            markup = InlineKeyboardMarkup().add(back_button, close_button)
-            bot.edit_message_text(chart_message, call.message.chat.id, user_data[call.message.chat.id]["message_id"], reply_markup=markup)
-
-        with open(filename, 'rb') as file:
-            bot.send_document(call.message.chat.id, file)
-
-        os.remove(filename)
-    except requests.exceptions.RequestException as e:
-        bot.send_message(call.message.chat.id, f"Error: {str(e)}")
+        with metrics.stage('month_chart', 'export'):
+            csv_data = chart_store.chart_csv(header, tuple(data))
+        formatted_data = format_chart_data(csv_data.decode('utf-8'))
+        chart_message = f"Here is the Satta King Chart for {month.capitalize()} {year}:\n\n{formatted_data}"
+        # get_month only refreshes in the background when the stored copy is not fresh
+        chart_message += stale_note(time.time() - fetched_at, not chart_store.is_fresh(int(year), int(month_number), fetched_at))
+        markup = keyboards.get('back_to_year_selection', lambda: back_close_keyboard("Back to Year Selection", "back_to_year_selection"))
+        with metrics.stage('month_chart', 'send'):
+            # Wait for the queued edit so the stage times the Bot API call; the outbox logs a failure
+            outbox.edit_message_text(chart_message, call.message.chat.id, get_menu_message_id(call.message), reply_markup=markup).exception()
+            documents.send_document(outbox, call.message.chat.id, csv_data, filename)
     except Exception as e:
-        bot.send_message(call.message.chat.id, f"Error: {str(e)}")
+        logging.error(f"Error sending the chart for {month.capitalize()} {year}: {str(e)}")
+        outbox.send_message(call.message.chat.id, user_error_message(e))
 
 def format_chart_data(csv_data):
-    lines = csv_data.strip().split('\n')
+    lines = csv_data.strip().splitlines()
     formatted_lines = []
     for line in lines:
         formatted_line = '    '.join(line.split(','))
         formatted_lines.append(formatted_line)
     return '\n'.join(formatted_lines)
 
-def handle_prediction_query(call):
-    game_code = call.data.split('_')[1]
+def handle_prediction_query(call, game_code):
     game_info = GAME_NAMES.get(game_code)
 
     try:
-        response = requests.get(URL)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        game_element = soup.find('h3', class_='game-name', string=game_info['name'])
-        if not game_element:
-            raise ValueError(f"Game {game_info['name']} not found on the website.")
-
-        today_number_element = game_element.find_next('td', class_='today-number').find('h3')
-        today_number = today_number_element.text.strip() if today_number_element else None
-
-        yesterday_number_element = game_element.find_next('td', class_='yesterday-number').find('h3')
-        yesterday_number = yesterday_number_element.text.strip() if yesterday_number_element else None
+        with metrics.stage('prediction', 'scrape'):
+            game = homepage.get_game(game_info['name'])
+        if not game:
+            outbox.send_message(call.message.chat.id, f"{game_info['name']} is not on the website right now.")
+            return
 
-        # Fetch yesterday's time element
-        yesterday_time_element = game_element.find_next('h3', class_='game-time').text.strip() if game_element.find_next('h3', class_='game-time') else None
+        today_number = game['today']
+        yesterday_number = game['yesterday']
+        yesterday_time_element = game['time']
 
         ist_now = get_current_time()
         formatted_date_today = ist_now.strftime('%d %B %Y')
@@ -333,175 +424,243 @@ def handle_prediction_query(call):
             )
             latest_number = yesterday_number
 
-        markup = InlineKeyboardMarkup(row_width=2)
-        back_button = InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data="back_to_start")
-        latest_number_button = InlineKeyboardButton(f"Check Chart {latest_number} 🎲", callback_data="show_latest_number")
-        close_button = InlineKeyboardButton(f"{EMOJI_STOP} Close", callback_data="close")
-
-        markup.add(latest_number_button, back_button)
-        markup.add(close_button)
-
-        user_data[call.message.chat.id]['latest_number'] = latest_number
-        bot.edit_message_text(prediction_message, call.message.chat.id, call.message.message_id, reply_markup=markup)
+        snapshot_age = homepage.age()
+        prediction_message += stale_note(snapshot_age, snapshot_age is not None and snapshot_age >= homepage.SNAPSHOT_TTL)
+        markup = keyboards.get(('prediction', game_code, latest_number), lambda: prediction_keyboard(game_code, latest_number))
+        sessions.update(call.message.chat.id, latest_number=latest_number)
+        with metrics.stage('prediction', 'send'):
+            # Wait for the queued edit so the stage times the Bot API call; the outbox logs a failure
+            outbox.edit_message_text(prediction_message, call.message.chat.id, call.message.message_id, reply_markup=markup).exception()
 
     except requests.exceptions.RequestException as e:
         error_message = f"Error fetching data from the website: {str(e)}"
         logging.error(error_message)
-        bot.send_message(call.message.chat.id, error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
     except Exception as e:
         error_message = f"Error fetching prediction for {game_info['name']} ({game_code}): {str(e)}"
         logging.error(error_message)
-        bot.send_message(call.message.chat.id, error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
+
+def handle_stats_query(call, game_code):
+    game_info = GAME_NAMES.get(game_code)
+
+    try:
+        stats = analytics.game_stats(game_code, game_info['name'])
+        markup = keyboards.get(('stats', game_code), lambda: back_close_keyboard("Back", f"predict_{game_code}"))
+        outbox.edit_message_text(format_game_stats(stats, game_info), call.message.chat.id, call.message.message_id, reply_markup=markup)
+
+    except Exception as e:
+        error_message = f"Error fetching statistics for {game_info['name']} ({game_code}): {str(e)}"
+        logging.error(error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
+
+def format_game_stats(stats, game_info):
+    if not stats:
+        return f"No chart history is stored for {game_info['name']} yet."
+
+    def numbers(pairs, unit=''):
+        return ', '.join(f"{value:02d} ({count}{unit})" for value, count in pairs)
+
+    weekday_name = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][stats['weekday']]
+    repeat_number, repeat_length = stats['longest_repeat']
+    return (
+        f"📈 {game_info['name']} statistics\n"
+        f"{stats['draws']} results from {stats['first_date'].strftime('%d %B %Y')} "
+        f"to {stats['last_date'].strftime('%d %B %Y')}\n\n"
+        f"🔥 Hot: {numbers(stats['hot'])}\n"
+        f"❄️ Cold: {numbers(stats['cold'])}\n"
+        f"⏳ Overdue: {numbers(stats['overdue'], ' draws')}\n\n"
+        f"Andar (first digit) most/least: {int(stats['tens'].argmax())} / {int(stats['tens'].argmin())}\n"
+        f"Bahar (second digit) most/least: {int(stats['units'].argmax())} / {int(stats['units'].argmin())}\n\n"
+        f"{EMOJI_CALENDAR} Most common on {weekday_name}s: {numbers(stats['weekday_top'])}\n"
+        f"Longest repeat: {repeat_number:02d} for {repeat_length} draws in a row"
+    )
 
 def show_latest_number(call):
     try:
         # Inline keyboard to select the range of months
-        markup = InlineKeyboardMarkup(row_width=3)
-        months_buttons = [
-            InlineKeyboardButton(f"{months} months", callback_data=f"months_{months}")
-            for months in range(6, 121, 6)
-        ]
-        markup.add(*months_buttons)
-        markup.add(InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data="back_to_start"))
+        markup = keyboards.get('months', lambda: range_keyboard(
+            'months', InlineKeyboardButton(f"{EMOJI_BACK} Back", callback_data="back_to_start")))
+        outbox.edit_message_text("Select the range for chart data:", call.message.chat.id, call.message.message_id, reply_markup=markup)
 
-        bot.edit_message_text("Select the range for chart data:", call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except Exception as e:
+        error_message = f"Error: {str(e)}"
+        logging.error(error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
+
+def handle_months_selection(call, months):
+    try:
+        # Build and send the file in the background
+        preparing_message_id = send_preparing_message(call.message.chat.id)
+        workers.run_in_background(send_months_export, call.message.chat.id, months, {"latest_number": sessions.get(call.message.chat.id).latest_number}, preparing_message_id)
 
     except Exception as e:
         error_message = f"Error: {str(e)}"
         logging.error(error_message)
-        bot.send_message(call.message.chat.id, error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
 
-def handle_months_selection(call):
+def send_preparing_message(chat_id):
+    """Tell the user the export has started, before it waits for a background worker."""
+    return outbox.send_message(chat_id, "Please wait, preparing your file...").result().message_id
+
+def send_months_export(chat_id, months, user_data, preparing_message_id):
     try:
-        # Extract the number of months from the callback data
-        months = int(call.data.split('_')[1])
+        last_update = 0
 
-        # Inform the user that the file is being prepared
-        preparing_message = bot.send_message(call.message.chat.id, "Please wait, preparing your file...")
+        def report_progress(status, force=False):
+            # Throttled, and queued edits are merged, so only the latest status is sent
+            nonlocal last_update
+            now = time.monotonic()
+            if force or now - last_update >= PROGRESS_INTERVAL:
+                last_update = now
+                outbox.edit_message_text(f"Please wait, preparing your file...\n{status}", chat_id, preparing_message_id)
 
         # Fetch chart data for the selected number of months
-        file_path = fetch_chart_data_for_months(months, user_data[call.message.chat.id])
+        document, document_key, failures = fetch_chart_data_for_months(months, user_data, report_progress)
 
         # Delete the "Please wait" message
-        bot.delete_message(call.message.chat.id, preparing_message.message_id)
+        outbox.delete_message(chat_id, preparing_message_id)
 
-        # Send the generated Excel file to the user
-        bot.send_document(call.message.chat.id, open(file_path, 'rb'))
+        if document is None:
+            outbox.send_message(chat_id, f"No chart data could be fetched for the last {months} months. Please try again later.")
+            return
 
-        # Remove the file after sending
-        os.remove(file_path)
+        # Send the generated Excel file to the user
+        with metrics.stage('months_export', 'send'):
+            documents.send_document(outbox, chat_id, document, f"satta_king_last_{months}_months.xlsx", key=document_key)
+        if failures:
+            outbox.send_message(chat_id, format_export_failures(failures))
 
     except Exception as e:
         error_message = f"Error: {str(e)}"
         logging.error(error_message)
-        bot.send_message(call.message.chat.id, error_message)
-
-def fetch_chart_data_for_months(months, user_data):
+        outbox.send_message(chat_id, user_error_message(e))
+
+def format_export_failures(failures):
+    lines = [f"⚠️ {len(failures)} month(s) are missing from the file:"]
+    for (year, month), reason in failures[:MAX_LISTED_FAILURES]:
+        lines.append(f"{datetime(year, month, 1).strftime('%B %Y')}: {reason}")
+    if len(failures) > MAX_LISTED_FAILURES:
+        lines.append(f"...and {len(failures) - MAX_LISTED_FAILURES} more")
+    return '\n'.join(lines)
+
+def fetch_chart_data_for_months(months, user_data, progress=None):
+    """Build the export for the last `months` months; returns (document, document_key, failures).
+
+    Months that fail are left out of the file and listed in failures as
+    ((year, month), reason). document is None when no month could be fetched.
+    document_key identifies the data in the file, for reusing its Telegram file_id.
+    """
     try:
-        # Initialize workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Satta King Chart Last {months} Months"
-
         # Setting header row with larger font and bold text
         headers = ['DATE'] + [game_info['name'] for game_info in GAME_NAMES.values()]
-        header_font = Font(size=12, bold=True)  # Larger font size and bold
-        header_fill = PatternFill(start_color='FFC7CE', end_color='FFC7CE', fill_type='solid')
-
-        ws.append(headers)
-        for col_num, cell in enumerate(ws[1], start=1):
-            cell.font = header_font
-            cell.fill = header_fill
-            ws.column_dimensions[chr(64 + col_num)].width = 15  # Adjust column width
-
-        yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
 
         # Fetch data for each of the last 'months' months
-        current_date = datetime.now()
         latest_number = user_data.get('latest_number')
 
-        for i in range(months):
-            month = (current_date - timedelta(days=i*30)).month
-            year = (current_date - timedelta(days=i*30)).year
-
-            chart_url = f"https://satta-king-fast.com/chart.php?month={month:02}&year={year}"
-
-            response = requests.get(chart_url)
-            response.raise_for_status()
+        month_list = chart_store.last_months(months)
+        plan = chart_store.plan_months(month_list)
+        if progress:
+            progress(f"Fetching results for {months} months ({len(plan[1])} to download)...", force=True)
+
+        done = 0
+        charts = {}
+        failures = []
+        with metrics.stage('months_export', 'scrape'):
+            # Months arrive as they complete; stored ones first
+            for (year, month), chart, error in chart_store.iter_months(month_list, plan):
+                done += 1
+                if error is not None:
+                    logging.error(f"Error fetching {month}-{year}: {str(error)}")
+                    failures.append(((year, month), "the website did not respond"))
+                elif chart is None:
+                    failures.append(((year, month), "no chart on the website"))
+                elif not chart[1]:
+                    failures.append(((year, month), "no results yet"))
+                else:
+                    charts[(year, month)] = chart[1]
+                if progress:
+                    progress(f"Fetched {done}/{months} months", force=done == months)
+
+        if not charts:
+            return None, None, failures
+
+        # Newest month first, whatever order the fetches finished in
+        month_charts = [(pair, charts[pair]) for pair in month_list if pair in charts]
+        failures.sort(key=lambda failure: failure[0], reverse=True)
+
+        # Reuse the export if the same range and number was built from the same data
+        artifact_key = (months, latest_number, artifact_cache.data_version(month_charts))
+        document = artifact_cache.artifacts.get(artifact_key)
+        if document is None:
+            if progress:
+                progress("Building your Excel file...", force=True)
+            with metrics.stage('months_export', 'export'):
+                document = workers.build_chart_workbook(
+                    f"Satta King Chart Last {months} Months", headers, month_charts, latest_number
+                )
+            artifact_cache.artifacts.put(artifact_key, document)
+
+        return document, artifact_cache.key_digest(artifact_key), failures
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            table = soup.find('table', class_='chart-table')
-            if not table:
-                raise ValueError(f"No data table found for {month}-{year}")
-
-            rows = table.find_all('tr')
-            if len(rows) < 3:
-                raise ValueError(f"Insufficient data rows in the table for {month}-{year}")
-
-            # Add month-year title row
-            ws.append([f"{datetime(year, month, 1).strftime('%B-%Y')}"])
-
-            for row in rows[2:]:
-                date_cell = row.find('td', class_='day')
-                if not date_cell:
-                    continue
-
-                date = date_cell.text.strip()
-                numbers = [cell.text.strip() for cell in row.find_all('td', class_='number')]
-
-                row_data = [date] + numbers
-                ws.append(row_data)
-
-                # Highlight cells with the latest number
-                if latest_number and latest_number in numbers:
-                    col_num = numbers.index(latest_number) + 2  # +2 because 1st column is date
-                    ws.cell(row=ws.max_row, column=col_num).fill = yellow_fill
-
-                # Increase row height
-                ws.row_dimensions[ws.max_row].height = 17
-
-        file_path = f"satta_king_last_{months}_months.xlsx"
-        wb.save(file_path)
-
-        return file_path
-
-    except requests.exceptions.RequestException as e:
-        error_message = f"Error fetching data from the website: {str(e)}"
-        logging.error(error_message)
-        raise
     except Exception as e:
         error_message = f"Error generating chart: {str(e)}"
         logging.error(error_message)
         raise
 
-def handle_number_months_selection(call):
+def handle_number_months_selection(call, months):
     try:
-        months = int(call.data.split('_')[2])
-        user_number = user_data[call.message.chat.id]['number']
-
-        # Inform the user that the file is being prepared
-        preparing_message = bot.send_message(call.message.chat.id, "Please wait, preparing your file...")
-
-        # Fetch chart data for the selected number of months
-        file_path = fetch_chart_data_for_months(months, {"latest_number": user_number})
+        user_number = sessions.get(call.message.chat.id).number
+        if not user_number:
+            outbox.send_message(call.message.chat.id, "Please tell me your number first using Check My Number 🔍")
+            return
 
-        # Delete the "Please wait" message
-        bot.delete_message(call.message.chat.id, preparing_message.message_id)
+        # Build and send the file in the background
+        preparing_message_id = send_preparing_message(call.message.chat.id)
+        workers.run_in_background(send_number_export, call.message.chat.id, months, user_number, preparing_message_id)
 
-        # Send the generated Excel file to the user
-        bot.send_document(call.message.chat.id, open(file_path, 'rb'))
+    except Exception as e:
+        error_message = f"Error: {str(e)}"
+        logging.error(error_message)
+        outbox.send_message(call.message.chat.id, user_error_message(e))
 
-        # Remove the file after sending
-        os.remove(file_path)
+def send_number_export(chat_id, months, user_number, preparing_message_id):
+    send_months_export(chat_id, months, {"latest_number": user_number}, preparing_message_id)
+    send_number_summary(chat_id, months, user_number)
 
+def send_number_summary(chat_id, months, user_number):
+    try:
+        year, month = chart_store.last_months(months)[-1]
+        stats = history.lookup(user_number, since=date(year, month, 1), today=get_current_time().date())
+        outbox.send_message(chat_id, format_number_summary(stats, months))
     except Exception as e:
         error_message = f"Error: {str(e)}"
         logging.error(error_message)
-        bot.send_message(call.message.chat.id, error_message)
+        outbox.send_message(chat_id, user_error_message(e))
+
+def format_number_summary(stats, months):
+    if not stats['occurrences']:
+        return f"🔍 Number {stats['number']} has not appeared in the last {months} months."
+
+    game_names = {code: game_info['name'] for code, game_info in GAME_NAMES.items()}
+    lines = [
+        f"🔍 Number {stats['number']} in the last {months} months:",
+        f"Appeared {len(stats['occurrences'])} times",
+        "",
+    ]
+    for game, count in sorted(stats['counts'].items(), key=lambda item: -item[1]):
+        lines.append(f"{game_names.get(game, game)}: {count}")
+
+    last_date, last_game = stats['last_seen']
+    lines.append("")
+    lines.append(f"{EMOJI_CALENDAR} Last seen: {date.fromisoformat(last_date).strftime('%d %B %Y')} "
+                 f"({game_names.get(last_game, last_game)})")
+    lines.append(f"Days since last seen: {stats['days_since_last']}")
+    if stats['average_gap'] is not None:
+        lines.append(f"Gap between appearances: {stats['average_gap']:.1f} days on average, "
+                     f"{stats['longest_gap']} days at most")
+    return '\n'.join(lines)
 
 if __name__ == "__main__":
-    try:
-        bot.polling(none_stop=True)  # Start bot polling
-    except Exception as e:
-        logging.error(f"Error occurred: {e}")
-        start_polling()  # Restart polling in case of an error
+    poller.start()  # Keep results warm in the background
+    bot.infinity_polling()  # Start bot polling; restarts itself after network errors
@@ -0,0 +1,130 @@
+import time
+import threading
+from contextlib import contextmanager
+from telebot import apihelper
+
+# Histogram buckets in seconds, from a fast cache hit to a 120-month export
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+def _label_text(labels, extra=None):
+    items = list(labels)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+class Counter:
+    """Prometheus counter with optional labels."""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {value}")
+        return lines
+
+class Histogram:
+    """Prometheus histogram with optional labels."""
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(key, ('le', '+Inf'))} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {series[-1]}")
+        return lines
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metrics
+upstream_seconds = Histogram('satta_upstream_fetch_seconds', 'Time spent downloading pages from the website.')
+upstream_errors = Counter('satta_upstream_fetch_errors_total', 'Failed downloads from the website.')
+upstream_unchanged = Counter('satta_upstream_unchanged_total', 'Page fetches that returned the same content as the previous fetch.')
+upstream_short_circuits = Counter('satta_upstream_short_circuits_total', 'Page fetches refused because the circuit breaker was open.')
+parse_seconds = Histogram('satta_parse_seconds', 'Time spent parsing downloaded pages.')
+export_seconds = Histogram('satta_export_build_seconds', 'Time spent building Excel exports.')
+stage_seconds = Histogram('satta_handler_stage_seconds', 'Time spent in each stage of a handler.')
+callback_seconds = Histogram('satta_callback_seconds', 'Time spent handling a callback query, per route.')
+callback_errors = Counter('satta_callback_errors_total', 'Callback queries whose handler raised, per route.')
+telegram_seconds = Histogram('satta_telegram_api_seconds', 'Time spent in Telegram Bot API calls, per method.')
+telegram_errors = Counter('satta_telegram_api_errors_total', 'Telegram Bot API calls that failed, per method and status (HTTP code, or exception).')
+telegram_retries = Counter('satta_telegram_retries_total', 'Outgoing Bot API calls retried, per reason (flood, network).')
+outbox_coalesced = Counter('satta_outbox_coalesced_total', 'Message edits merged into an edit that was still queued.')
+broadcast_messages = Counter('satta_broadcast_messages_total', 'Result notifications sent to subscribers, per game and outcome.')
+
+def stage(flow, name):
+    """Time one stage (scrape, parse, export, send) of a handler flow."""
+    return stage_seconds.time(flow=flow, stage=name)
+
+def _timed_telegram_request(method, url, **kwargs):
+    api_method = url.rsplit('/', 1)[-1]
+    started = time.perf_counter()
+    try:
+        response = apihelper._get_req_session().request(method, url, **kwargs)
+    except Exception:
+        telegram_errors.inc(method=api_method, status='exception')
+        raise
+    finally:
+        telegram_seconds.observe(time.perf_counter() - started, method=api_method)
+    # Telegram reports 400/403/429 in ordinary responses, which telebot raises on later
+    if response.status_code >= 400:
+        telegram_errors.inc(method=api_method, status=str(response.status_code))
+    return response
+
+def instrument_telegram():
+    """Time every Bot API request made through telebot."""
+    apihelper.CUSTOM_REQUEST_SENDER = _timed_telegram_request
@@ -0,0 +1,262 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+import requests
+from telebot.apihelper import ApiTelegramException
+import metrics
+
+# Constants
+SENDER_THREADS = int(os.environ.get('OUTBOX_THREADS', 4))
+
+# The bot-wide limit is shared equally by the worker processes; one chat's calls
+# normally come from the worker handling its update, so it keeps the full chat limit
+WORKERS = int(os.environ.get('WORKERS', 1))
+GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30)) / WORKERS  # calls per second over all chats
+GLOBAL_BURST = max(1, GLOBAL_RATE / 10)  # kept small so no second goes over GLOBAL_RATE
+CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))  # calls per second in one chat
+CHAT_BURST = int(os.environ.get('TELEGRAM_CHAT_BURST', 5))
+MAX_ATTEMPTS = 4
+# A 429 during a broadcast, or from FLOOD_CHATS chats within FLOOD_WINDOW seconds,
+# comes from the bot-wide limit and pauses every chat; other 429s pause one chat
+FLOOD_CHATS = 3
+FLOOD_WINDOW = 5.0
+MAX_CHAT_BUCKETS = 10000
+
+# Lower values are sent first
+PRIORITY_EDIT = 0
+PRIORITY_MESSAGE = 1
+PRIORITY_DOCUMENT = 2
+PRIORITY_BROADCAST = 3
+
+class TokenBucket:
+    """Allows `rate` calls per second with bursts of up to `burst` calls."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until the next call may be sent, 0 if it may be sent now."""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds, now):
+        """Send nothing for `seconds`, e.g. Telegram's retry_after."""
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst and self.paused_until <= now
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'chat_id', 'method', 'args', 'kwargs', 'key', 'future', 'attempts')
+
+    def __init__(self, priority, seq, chat_id, method, args, kwargs, key):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+        self.attempts = 0
+
+def _retry_after(error):
+    parameters = (error.result_json or {}).get('parameters') or {}
+    return parameters.get('retry_after', 1)
+
+def _chain(source, target):
+    """Resolve target with the outcome of source."""
+    def copy(future):
+        if future.exception() is not None:
+            target.set_exception(future.exception())
+        else:
+            target.set_result(future.result())
+    source.add_done_callback(copy)
+
+class Outbox:
+    """Outgoing Bot API calls, sent by a few threads within Telegram's rate limits.
+
+    Edits and deletions go before new messages, new messages before document
+    uploads, and broadcasts go last. Calls to one chat are sent one at a time,
+    and an edit of a message whose previous edit is still queued replaces it.
+    Flood-control errors (429) pause the chat for Telegram's retry_after, and
+    every chat when they come from the bot-wide limit (see FLOOD_CHATS);
+    network errors are retried with exponential backoff. Every method returns
+    a Future with the Bot API result.
+    """
+
+    def __init__(self, bot, threads=SENDER_THREADS):
+        self.bot = bot
+        self.threads = threads
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats = {}
+        self._queue = []  # (priority, seq, job) ready to send
+        self._delayed = []  # (not_before, seq, job) waiting for a rate limit or a retry
+        self._edits = {}  # (chat_id, message_id) -> queued edit
+        self._busy = set()  # chats with a call in flight
+        self._parked = {}  # chat_id -> queue entries waiting for that call
+        self._floods = {}  # chat_id -> time of its latest 429
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._started = False
+
+    def send_message(self, chat_id, text, **kwargs):
+        return self.submit(PRIORITY_MESSAGE, chat_id, 'send_message', chat_id, text, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        return self.submit(PRIORITY_EDIT, chat_id, 'edit_message_text', text, chat_id, message_id,
+                           coalesce=(chat_id, message_id), **kwargs)
+
+    def delete_message(self, chat_id, message_id):
+        return self.submit(PRIORITY_EDIT, chat_id, 'delete_message', chat_id, message_id)
+
+    def send_document(self, chat_id, document, **kwargs):
+        return self.submit(PRIORITY_DOCUMENT, chat_id, 'send_document', chat_id, document, **kwargs)
+
+    def broadcast_message(self, chat_id, text, **kwargs):
+        return self.submit(PRIORITY_BROADCAST, chat_id, 'send_message', chat_id, text, **kwargs)
+
+    def submit(self, priority, chat_id, method, *args, coalesce=None, **kwargs):
+        """Queue bot.<method>(*args, **kwargs) for chat_id and return its Future."""
+        with self._condition:
+            if not self._started:
+                self._start()
+            queued = self._edits.get(coalesce) if coalesce else None
+            if queued is not None:
+                # Only the newest text of a message is worth sending
+                queued.args, queued.kwargs = args, kwargs
+                metrics.outbox_coalesced.inc()
+                return queued.future
+            job = _Job(priority, next(self._seq), chat_id, method, args, kwargs, coalesce)
+            if coalesce:
+                self._edits[coalesce] = job
+            heapq.heappush(self._queue, (job.priority, job.seq, job))
+            self._condition.notify()
+            return job.future
+
+    def _start(self):
+        for number in range(self.threads):
+            threading.Thread(target=self._run, name=f'outbox-{number}', daemon=True).start()
+        self._started = True
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                self._chats = {chat: b for chat, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return bucket
+
+    def _run(self):
+        while True:
+            self._send(self._next_job())
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._queue, (job.priority, seq, job))
+                job, timeout = self._pop_ready(now)
+                if job is not None:
+                    return job
+                self._condition.wait(timeout)
+
+    def _pop_ready(self, now):
+        """Take the first queued job whose chat is idle and within the rate limits."""
+        timeout = self._delayed[0][0] - now if self._delayed else None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            job = entry[2]
+            if job.chat_id in self._busy:
+                self._parked.setdefault(job.chat_id, []).append(entry)
+                continue
+            bucket = self._bucket(job.chat_id)
+            wait = max(bucket.delay(now), self._global.delay(now))
+            if wait > 0:
+                heapq.heappush(self._delayed, (now + wait, job.seq, job))
+                timeout = wait if timeout is None else min(timeout, wait)
+                continue
+            bucket.take()
+            self._global.take()
+            self._busy.add(job.chat_id)
+            if job.key:
+                self._edits.pop(job.key, None)
+            return job, None
+        return None, timeout
+
+    def _bot_wide_flood(self, job, now):
+        """Whether a 429 for job comes from the bot-wide limit rather than its chat's."""
+        self._floods = {chat: at for chat, at in self._floods.items() if now - at <= FLOOD_WINDOW}
+        self._floods[job.chat_id] = now
+        return job.priority == PRIORITY_BROADCAST or len(self._floods) >= FLOOD_CHATS
+
+    def _send(self, job):
+        job.attempts += 1
+        result = error = delay = reason = None
+        try:
+            # A document stream read by a failed attempt is sent again from the start
+            for value in job.args:
+                if hasattr(value, 'seek'):
+                    value.seek(0)
+            result = getattr(self.bot, job.method)(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            error = e
+            if e.error_code == 429:
+                delay, reason = _retry_after(e), 'flood'
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            delay, reason = 2 ** (job.attempts - 1), 'network'
+        except Exception as e:
+            error = e
+
+        with self._condition:
+            now = time.monotonic()
+            self._busy.discard(job.chat_id)
+            for entry in self._parked.pop(job.chat_id, []):
+                heapq.heappush(self._queue, entry)
+            retry = delay is not None and job.attempts < MAX_ATTEMPTS
+            if retry:
+                metrics.telegram_retries.inc(reason=reason)
+                if reason == 'flood':
+                    self._bucket(job.chat_id).pause(delay, now)
+                    if self._bot_wide_flood(job, now):
+                        self._global.pause(delay, now)
+                newer = self._edits.get(job.key) if job.key else None
+                if newer is not None:
+                    # A newer edit of the same message is queued and supersedes this one
+                    _chain(newer.future, job.future)
+                else:
+                    if job.key:
+                        self._edits[job.key] = job
+                    heapq.heappush(self._delayed, (now + delay, job.seq, job))
+            self._condition.notify_all()
+
+        if retry:
+            logging.warning(f"Telegram {job.method} to {job.chat_id} failed, retrying in {delay}s: {str(error)}")
+        elif error is not None:
+            logging.error(f"Telegram {job.method} to {job.chat_id} failed: {str(error)}")
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
@@ -0,0 +1,126 @@
+import os
+import re
+import logging
+import threading
+import uuid
+from datetime import datetime
+import pytz
+import chart_store
+import history
+import homepage
+import shared_state
+
+# Constants
+TIMEZONE = 'Asia/Kolkata'
+
+# Poll every FAST_INTERVAL seconds from WINDOW_BEFORE minutes before a draw
+# until WINDOW_AFTER minutes after it, and every SLOW_INTERVAL seconds otherwise.
+FAST_INTERVAL = int(os.environ.get('POLL_FAST_INTERVAL', 30))
+SLOW_INTERVAL = int(os.environ.get('POLL_SLOW_INTERVAL', 600))
+WINDOW_BEFORE = int(os.environ.get('POLL_WINDOW_BEFORE', 10))
+WINDOW_AFTER = int(os.environ.get('POLL_WINDOW_AFTER', 60))
+
+GAME_TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})\s*([AP]M)', re.IGNORECASE)
+
+# Only one worker process polls at a time; the others read what it stores
+LEASE_NAME = 'poller'
+LEASE_OWNER = f"{os.getpid()}-{uuid.uuid4().hex}"
+LEASE_TTL = SLOW_INTERVAL + 60
+
+_stop = threading.Event()
+_thread = None
+_listeners = []
+
+def parse_draw_time(text):
+    """Return the draw time from a game-time text as minutes after midnight, or None."""
+    match = GAME_TIME_PATTERN.search(text or '')
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)) % 12, int(match.group(2)), match.group(3).upper()
+    if meridiem == 'PM':
+        hour += 12
+    return hour * 60 + minute
+
+def draw_times(games):
+    """Return the draw times of every game in a homepage snapshot."""
+    times = (parse_draw_time(game['time']) for game in games.values())
+    return sorted(t for t in times if t is not None)
+
+def in_draw_window(minutes_now, draws):
+    """Check whether the time of day is inside the polling window of any draw."""
+    for draw in draws:
+        delta = (minutes_now - draw) % (24 * 60)
+        if delta <= WINDOW_AFTER or delta >= 24 * 60 - WINDOW_BEFORE:
+            return True
+    return False
+
+def on_result(listener):
+    """Register listener(game_name, number) to be called once when a game's result is published."""
+    _listeners.append(listener)
+    return listener
+
+def new_results(previous, games):
+    """(name, number) for every game whose today's number went from XX (or empty) to a number.
+
+    Games missing from the previous snapshot are skipped, so results that were
+    already out before the poller (re)started are not announced.
+    """
+    results = []
+    for name, game in games.items():
+        before = (previous or {}).get(name)
+        number = history.normalize_number(game['today'])
+        if before is not None and number is not None and history.normalize_number(before['today']) is None:
+            results.append((name, number))
+    return results
+
+def announce(results):
+    ist_today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    for name, number in results:
+        # The lease can change hands between polls; announce each result only once
+        if not shared_state.claim(f"result:{name}:{ist_today}:{number}"):
+            continue
+        for listener in _listeners:
+            try:
+                listener(name, number)
+            except Exception as e:
+                logging.error(f"Result listener error: {str(e)}")
+
+# Every published snapshot is checked, whether the poller or a user's request fetched it
+@homepage.on_publish
+def announce_new_results(previous, games):
+    announce(new_results(previous, games))
+
+def poll_once():
+    """Refresh the homepage snapshot and the current month's chart; new results are announced on publish."""
+    games = homepage.refresh()
+    chart_store.refresh_month(*chart_store.current_month())
+    return games
+
+def next_interval(games):
+    ist_now = datetime.now(pytz.timezone(TIMEZONE))
+    minutes_now = ist_now.hour * 60 + ist_now.minute
+    return FAST_INTERVAL if in_draw_window(minutes_now, draw_times(games)) else SLOW_INTERVAL
+
+def run():
+    games = {}
+    while not _stop.is_set():
+        try:
+            if shared_state.acquire_lease(LEASE_NAME, LEASE_OWNER, LEASE_TTL):
+                games = poll_once()
+            else:
+                games = homepage.get_snapshot()
+        except Exception as e:
+            logging.error(f"Poller error: {str(e)}")
+        _stop.wait(next_interval(games))
+
+def start():
+    """Start the background poller thread once per process."""
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=run, name='result-poller', daemon=True)
+    _thread.start()
+
+def stop():
+    _stop.set()
@@ -0,0 +1,89 @@
+import re
+import time
+import logging
+import metrics
+
+# Parameters are plain ASCII words or numbers; anything else is malformed data
+PARAM_PATTERN = re.compile(r'[A-Za-z0-9]+')
+
+def one_of(values, convert=int):
+    """Converter that only accepts converted values found in `values`, or in what a callable `values` returns."""
+    def converter(raw):
+        value = convert(raw)
+        if value not in (values() if callable(values) else values):
+            raise ValueError(f"{raw} is not an accepted value")
+        return value
+    return converter
+
+class CallbackRouter:
+    """Dispatch callback queries by exact key or by prefix with typed parameters.
+
+    Callback data is either an exact key ('chart') or a prefix followed by
+    parameters separated by underscores ('month_january_2020'). Prefixes are
+    matched longest first, so 'number_months_6' never reaches 'months'.
+    Callback data comes from the client, so bound parameters with one_of.
+    """
+
+    def __init__(self, bot, outbox):
+        self.bot = bot
+        self.outbox = outbox
+        self._exact = {}
+        self._prefixes = {}
+
+    def exact(self, key, handler):
+        """Route callback data equal to key to handler(call)."""
+        self._exact[key] = handler
+
+    def prefix(self, prefix, handler, *converters):
+        """Route '<prefix>_<p1>_<p2>...' to handler(call, p1, p2, ...), converting each parameter."""
+        self._prefixes[prefix] = (handler, converters)
+
+    def resolve(self, data):
+        """Return (route, handler, params) for callback data, or None if nothing matches."""
+        handler = self._exact.get(data)
+        if handler:
+            return data, handler, ()
+
+        candidate = data
+        while '_' in candidate:
+            candidate = candidate.rsplit('_', 1)[0]
+            route = self._prefixes.get(candidate)
+            if route is None:
+                continue
+            handler, converters = route
+            raw = data[len(candidate) + 1:].split('_')
+            if len(raw) != len(converters) or not all(PARAM_PATTERN.fullmatch(value) for value in raw):
+                return None
+            try:
+                return candidate, handler, tuple(convert(value) for convert, value in zip(converters, raw))
+            except (ValueError, KeyError):
+                return None
+        return None
+
+    def dispatch(self, call):
+        # Answer straight away so the button stops spinning while the handler runs
+        try:
+            self.bot.answer_callback_query(call.id)
+        except Exception as e:
+            logging.warning(f"Could not answer callback: {str(e)}")
+
+        resolved = self.resolve(call.data or '')
+        if resolved is None:
+            logging.warning(f"Unknown callback data: {call.data}")
+            return
+
+        route, handler, params = resolved
+        started = time.perf_counter()
+        try:
+            handler(call, *params)
+        except Exception as e:
+            metrics.callback_errors.inc(route=route)
+            logging.error(f"Callback error in {route}: {str(e)}")
+            try:
+                self.outbox.send_message(call.message.chat.id, "Something went wrong, please try again.")
+            except Exception as e:
+                logging.error(f"Could not report callback error: {str(e)}")
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.callback_seconds.observe(seconds, route=route)
+            logging.debug(f"Callback {route} took {seconds * 1000:.1f} ms")
@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import db
+
+# Constants
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 7 * 24 * 60 * 60))
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 50000))
+SESSION_DB = os.environ.get('SESSION_DB')
+
+# Several worker processes must share conversation state through the database
+if not SESSION_DB and int(os.environ.get('WORKERS', 1)) > 1:
+    SESSION_DB = db.DB_PATH
+
+# Expired rows are purged from the backend once every this many writes
+PURGE_EVERY = 1000
+
+class Session:
+    """Conversation state for one chat."""
+
+    __slots__ = ('chat_id', 'message_id', 'number', 'latest_number', 'awaiting_number', 'touched_at')
+    FIELDS = ('message_id', 'number', 'latest_number', 'awaiting_number')
+
+    def __init__(self, chat_id, message_id=None, number=None, latest_number=None, awaiting_number=False,
+                 touched_at=None):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.number = number
+        self.latest_number = latest_number
+        self.awaiting_number = bool(awaiting_number)
+        self.touched_at = touched_at or time.time()
+
+class SqliteSessionBackend:
+    """Keeps sessions in a SQLite file so they survive restarts and are shared by worker processes."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = db.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id INTEGER PRIMARY KEY, message_id INTEGER, number TEXT, "
+            "latest_number TEXT, touched_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if 'awaiting_number' not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN awaiting_number INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    def load(self, chat_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_id, number, latest_number, awaiting_number, touched_at "
+                "FROM sessions WHERE chat_id = ?",
+                (chat_id,)
+            ).fetchone()
+        return Session(chat_id, *row) if row else None
+
+    def save(self, session):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(chat_id, message_id, number, latest_number, awaiting_number, touched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session.chat_id, session.message_id, session.number, session.latest_number,
+                 int(session.awaiting_number), session.touched_at)
+            )
+            self._conn.commit()
+
+    def purge(self, cutoff):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE touched_at < ?", (cutoff,))
+            self._conn.commit()
+
+class SessionStore:
+    """Per-chat sessions with TTL and LRU eviction, optionally backed by persistent storage.
+
+    With a backend the backend is the source of truth and every lookup reads
+    through to it, so any worker process sees the latest state of any chat.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, backend=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.backend = backend
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _evict(self, now):
+        # Sessions are kept in least recently used order, so expired ones are at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.touched_at < self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def get(self, chat_id):
+        """Return the session for a chat, creating an empty one if there is none."""
+        now = time.time()
+        if self.backend:
+            session = self.backend.load(chat_id)
+            if session is None or now - session.touched_at >= self.ttl:
+                session = Session(chat_id)
+            session.touched_at = now
+            return session
+
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None or now - session.touched_at >= self.ttl:
+                session = Session(chat_id)
+            session.touched_at = now
+            self._sessions[chat_id] = session
+            self._sessions.move_to_end(chat_id)
+            self._evict(now)
+            return session
+
+    def update(self, chat_id, **fields):
+        """Set fields on a chat's session, keeping everything else it holds."""
+        session = self.get(chat_id)
+        for name, value in fields.items():
+            if name not in Session.FIELDS:
+                raise AttributeError(f"Unknown session field: {name}")
+            setattr(session, name, value)
+        if self.backend:
+            self.backend.save(session)
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self.backend.purge(time.time() - self.ttl)
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+sessions = SessionStore(backend=SqliteSessionBackend(SESSION_DB) if SESSION_DB else None)
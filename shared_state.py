@@ -0,0 +1,69 @@
+import json
+import time
+import threading
+import db
+
+# Snapshots and leases shared between worker processes through the local database
+_lock = threading.Lock()
+_conn = db.connect()
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS snapshots ("
+    "name TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+)
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS leases ("
+    "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+)
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS claims (name TEXT PRIMARY KEY, claimed_at REAL NOT NULL)"
+)
+_conn.commit()
+
+# Claims are kept long enough to outlive any repeat of the same event
+CLAIM_TTL = 7 * 24 * 60 * 60
+
+def save_snapshot(name, data, fetched_at):
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO snapshots (name, data, fetched_at) VALUES (?, ?, ?)",
+            (name, json.dumps(data), fetched_at)
+        )
+        _conn.commit()
+
+def touch_snapshot(name, fetched_at):
+    """Mark a shared snapshot as fetched at fetched_at without rewriting its data."""
+    with _lock:
+        _conn.execute("UPDATE snapshots SET fetched_at = ? WHERE name = ?", (fetched_at, name))
+        _conn.commit()
+
+def load_snapshot(name):
+    """Return (fetched_at, data) of a shared snapshot, or None."""
+    with _lock:
+        row = _conn.execute("SELECT data, fetched_at FROM snapshots WHERE name = ?", (name,)).fetchone()
+    if not row:
+        return None
+    return row[1], json.loads(row[0])
+
+def acquire_lease(name, owner, ttl):
+    """Take or renew a named lease; only one owner holds it until it expires."""
+    now = time.time()
+    with _lock:
+        _conn.execute(
+            "INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, 0)",
+            (name, owner)
+        )
+        cursor = _conn.execute(
+            "UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (owner = ? OR expires_at < ?)",
+            (owner, now + ttl, name, owner, now)
+        )
+        _conn.commit()
+        return cursor.rowcount == 1
+
+def claim(name):
+    """Record a one-off event; True only for the first caller in any process."""
+    now = time.time()
+    with _lock:
+        _conn.execute("DELETE FROM claims WHERE claimed_at < ?", (now - CLAIM_TTL,))
+        cursor = _conn.execute("INSERT OR IGNORE INTO claims (name, claimed_at) VALUES (?, ?)", (name, now))
+        _conn.commit()
+        return cursor.rowcount == 1
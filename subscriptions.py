@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+from telebot.apihelper import ApiTelegramException
+import db
+import metrics
+
+# Constants
+# Each chat's subscriptions are one integer, bit i set for GAMES[i];
+# the positions are stored, so only ever append to this tuple.
+GAMES = ('DSWR', 'FRBD', 'GZBD', 'GALI')
+BROADCAST_BATCH = int(os.environ.get('BROADCAST_BATCH', 500))
+
+_lock = threading.Lock()
+_conn = db.connect()
+_conn.execute(
+    "CREATE TABLE IF NOT EXISTS subscriptions (chat_id INTEGER PRIMARY KEY, games INTEGER NOT NULL)"
+)
+_conn.commit()
+
+def _bit(game):
+    return 1 << GAMES.index(game)
+
+def subscribe(chat_id, game):
+    """Subscribe a chat to a game's results; returns False if it already was."""
+    bit = _bit(game)
+    with _lock:
+        row = _conn.execute("SELECT games FROM subscriptions WHERE chat_id = ?", (chat_id,)).fetchone()
+        games = row[0] if row else 0
+        if games & bit:
+            return False
+        _conn.execute(
+            "INSERT OR REPLACE INTO subscriptions (chat_id, games) VALUES (?, ?)", (chat_id, games | bit)
+        )
+        _conn.commit()
+    return True
+
+def unsubscribe(chat_id, game=None):
+    """Remove one game, or every game when game is None, from a chat's subscriptions."""
+    with _lock:
+        if game is None:
+            _conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+        else:
+            _conn.execute("UPDATE subscriptions SET games = games & ~? WHERE chat_id = ?", (_bit(game), chat_id))
+            _conn.execute("DELETE FROM subscriptions WHERE chat_id = ? AND games = 0", (chat_id,))
+        _conn.commit()
+
+def games_of(chat_id):
+    """The games a chat is subscribed to, in GAMES order."""
+    with _lock:
+        row = _conn.execute("SELECT games FROM subscriptions WHERE chat_id = ?", (chat_id,)).fetchone()
+    games = row[0] if row else 0
+    return [game for game in GAMES if games & _bit(game)]
+
+def subscribers(game, after=None, limit=BROADCAST_BATCH):
+    """Up to `limit` subscribed chat ids greater than `after`, in ascending order."""
+    with _lock:
+        rows = _conn.execute(
+            "SELECT chat_id FROM subscriptions WHERE games & ? AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (_bit(game), after if after is not None else -2 ** 63, limit)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+def broadcast(outbox, game, text):
+    """Send text to every subscriber of a game through the outbox, one batch of chats at a time.
+
+    Each batch is queued at broadcast priority and awaited before the next one is
+    read, so interactive replies keep going first and the queue stays bounded.
+    Chats that blocked the bot are unsubscribed. Returns (sent, failed).
+    """
+    sent = failed = 0
+    after = None
+    while True:
+        chat_ids = subscribers(game, after)
+        if not chat_ids:
+            break
+        queued = [(chat_id, outbox.broadcast_message(chat_id, text)) for chat_id in chat_ids]
+        for chat_id, future in queued:
+            try:
+                future.result()
+                sent += 1
+            except ApiTelegramException as e:
+                failed += 1
+                if e.error_code == 403:
+                    # The user blocked the bot or deleted the chat
+                    unsubscribe(chat_id)
+            except Exception:
+                failed += 1
+        after = chat_ids[-1]
+    metrics.broadcast_messages.inc(sent, game=game, outcome='sent')
+    metrics.broadcast_messages.inc(failed, game=game, outcome='failed')
+    logging.info(f"Broadcast for {game}: {sent} sent, {failed} failed")
+    return sent, failed
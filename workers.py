@@ -0,0 +1,60 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import excel_export
+import metrics
+
+# Constants
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 8))
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 4))
+EXPORT_PROCESSES = int(os.environ.get('EXPORT_PROCESSES', 2))
+
+# Incoming updates are handled here so the webhook can answer straight away
+update_pool = ThreadPoolExecutor(max_workers=UPDATE_WORKERS, thread_name_prefix='update')
+
+# Slow jobs (multi-month exports) run here so they never hold an update worker
+background_pool = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+
+# Workbook builds are CPU bound; when enabled they run in separate processes
+_export_pool = None
+
+def _log_failure(future):
+    error = future.exception()
+    if error:
+        logging.error(f"Background task error: {str(error)}")
+
+def submit_update(bot, update):
+    """Queue a Telegram update for processing and return without waiting for it.
+
+    The bot must be created with threaded=False, otherwise telebot hands the
+    handlers on to its own small thread pool and UPDATE_WORKERS has no effect.
+    """
+    future = update_pool.submit(bot.process_new_updates, [update])
+    future.add_done_callback(_log_failure)
+    return future
+
+def run_in_background(func, *args):
+    """Run a slow job off the update-processing path."""
+    future = background_pool.submit(func, *args)
+    future.add_done_callback(_log_failure)
+    return future
+
+def enable_export_processes():
+    """Build workbooks in a process pool instead of the calling thread.
+
+    Uses the spawn start method, so only call this from entry points whose
+    __main__ module is safe to import again (mains.py, uvicorn).
+    """
+    global _export_pool
+    if _export_pool is None and EXPORT_PROCESSES > 0:
+        _export_pool = ProcessPoolExecutor(
+            max_workers=EXPORT_PROCESSES, mp_context=multiprocessing.get_context('spawn')
+        )
+
+def build_chart_workbook(*args):
+    """Build an export workbook, in the process pool when it is enabled."""
+    with metrics.export_seconds.time():
+        if _export_pool is None:
+            return excel_export.build_chart_workbook(*args)
+        return _export_pool.submit(excel_export.build_chart_workbook, *args).result()